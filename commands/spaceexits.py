@@ -0,0 +1,50 @@
+"""
+Space Exit Commands
+
+These are the commands and command set used for the virtual exits of space
+rooms, when the map provider has `virtual_exits` enabled.
+"""
+
+from evennia import CmdSet
+from evennia import Command
+from world.space import EXITS
+
+
+class SpaceExitCmdSet(CmdSet):
+    """
+    The `SpaceExitCmdSet` holds one command per direction (`north`, `ne`,
+    `up`...). It is applied to the SpaceRoom on creation and replaces the
+    exit objects of the room.
+    """
+    key = "SpaceExitCmdSet"
+    priority = 101
+
+    def at_cmdset_creation(self):
+        """
+        Populates the cmdset
+        """
+        for key, alias in EXITS:
+            self.add(CmdSpaceDirection(key=key, aliases=[alias]))
+
+
+class CmdSpaceDirection(Command):
+    """
+    Move in a direction through space
+
+    Usage:
+      <direction>
+
+    Move one step towards the given direction, for example `north` or `up`.
+    """
+
+    locks = "cmd:all()"
+    help_category = "General"
+    auto_help = False
+
+    def func(self):
+        "Move the caller through space"
+        room = self.obj
+        if self.key not in room.valid_directions:
+            self.caller.msg("You cannot go there.")
+            return
+        room.traverse_direction(self.caller, self.key)
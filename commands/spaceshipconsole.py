@@ -7,7 +7,16 @@ These are the commands and command set for the SpaceShipConsole
 from evennia import CmdSet
 from evennia import Command
 from typeclasses.spaceship import SpaceShipHull
+from world import navigation
 from world.space import SpaceRoom
+from world.spaceindex import box_around
+
+
+# Default and greatest range of the scan command
+SCAN_RADIUS = 10
+SCAN_MAX_RADIUS = 20
+# Most ships and objects listed by the scan command
+SCAN_MAX_OBJECTS = 20
 
 
 class SSCCmdSet(CmdSet):
@@ -25,13 +34,14 @@ class SSCCmdSet(CmdSet):
         self.add(CmdSSCLat())
         self.add(CmdSSCLon())
         self.add(CmdSSCStep())
+        self.add(CmdSSCEngage())
+        self.add(CmdSSCHalt())
+        self.add(CmdSSCScan())
         self.add(CmdSSCPort())
         self.add(CmdSSCStarboard())
         self.add(CmdSSCUp())
         self.add(CmdSSCDown())
 
-        # TODO: Lat/Lon command adjusting for entries > 360 using `% 360`
-
 
 class CmdSSCLat(Command):
     """
@@ -58,15 +68,13 @@ class CmdSSCLat(Command):
         "Display or verify and set the latitude"
         caller = self.caller
         if not self.target:
-            if not self.obj.db.lat:
-                self.obj.db.lat = 0
-            caller.msg("The current latitude is {}".format(self.obj.db.lat))
+            caller.msg("The current latitude is {}".format(self.obj.lat))
         else:
             if int(self.target) % 45 != 0:
                 caller.msg("Latitude must be entered in increments of 45 degrees")
             else:
-                self.obj.db.lat = int(self.target)
-                caller.msg("The current latitude has been set to {}".format(self.obj.db.lat))
+                self.obj.lat = int(self.target)
+                caller.msg("The current latitude has been set to {}".format(self.obj.lat))
 
 
 class CmdSSCLon(Command):
@@ -94,15 +102,13 @@ class CmdSSCLon(Command):
         "Display or verify and set the longitude"
         caller = self.caller
         if not self.target:
-            if not self.obj.db.lon:
-                self.obj.db.lon = 0
-            caller.msg("The current longitude is {}".format(self.obj.db.lon))
+            caller.msg("The current longitude is {}".format(self.obj.lon))
         else:
             if int(self.target) % 45 != 0:
                 caller.msg("Longitude must be entered in increments of 45 degrees")
             else:
-                self.obj.db.lon = int(self.target) % 360
-                caller.msg("The current longitude has been set to {}".format(self.obj.db.lon))
+                self.obj.lon = int(self.target)
+                caller.msg("The current longitude has been set to {}".format(self.obj.lon))
 
 
 class CmdSSCStep(Command):
@@ -111,10 +117,11 @@ class CmdSSCStep(Command):
         temporary command.
 
     Usage:
-        step
+        step [<count>]
 
     Temporary command to step the ship into the next system along it's current
-        course.
+        course. When a count is given, the ship travels that many systems at
+        once.
     """
 
     key = "step"
@@ -127,11 +134,16 @@ class CmdSSCStep(Command):
         self.target = self.args.strip()
 
     def func(self):
-        "Take a step towards the next system"
+        "Take steps towards the next systems"
         caller = self.caller
+        steps = 1
         if self.target:
-            caller.msg("Step does not take any parameters")
-            return
+            if not self.target.isdigit() or \
+               not 0 < int(self.target) <= navigation.MAX_STEPS:
+                caller.msg("Step takes a number of steps between 1 and "
+                           "{}".format(navigation.MAX_STEPS))
+                return
+            steps = int(self.target)
         ship = self.obj.db.hull
         if not isinstance(ship, SpaceShipHull):
             caller.msg("Error locating ship!")
@@ -139,32 +151,160 @@ class CmdSSCStep(Command):
         if not isinstance(ship.location, SpaceRoom):
             caller.msg("Cannot step ship that is not in space!")
             return
-        coordinates = list(ship.location.coordinates)
-        x = 0
-        y = 0
-        z = 0
-        # Lat == 0 or Lat == 180: Ship upside down re ecliptic
-        if self.obj.db.lat > 0 and self.obj.db.lat < 180:
-            z = 1
-        if self.obj.db.lat > 180 and self.obj.db.lat < 360:
-            z = -1
-        if self.obj.db.lon > 270 or self.obj.db.lon < 90:
-            y = 1
-        if self.obj.db.lon > 90 and self.obj.db.lon < 270:
-            y = -1
-        if self.obj.db.lon > 0 and self.obj.db.lon < 180:
-            x = 1
-        if self.obj.db.lon > 180 and self.obj.db.lon < 360:
-            x = -1
-        coordinates[0] += x
-        coordinates[1] += y
-        coordinates[2] += z
-        coordinates = tuple(coordinates)
+        coordinates, taken = navigation.move_ship(ship, self.obj.heading_vector,
+                                                  steps)
+        if taken < steps:
+            caller.msg("The ship's course is blocked after {} step(s).".format(
+                taken))
         caller.msg("The new coordinates are {}, {}, {}".format(
             coordinates[0], coordinates[1], coordinates[2]
         ))
 
 
+class CmdSSCEngage(Command):
+    """
+    Engage the engines, moving the ship along its current course
+
+    Usage:
+        engage [<speed>]
+
+    The ship advances along its current course on its own, by <speed> systems
+        every few seconds, until it is halted. The speed defaults to 1.
+    """
+
+    key = "engage"
+    aliases = []
+    locks = "cmd:all()"
+    help_category = "General"
+
+    def parse(self):
+        "Very trivial parser"
+        self.target = self.args.strip()
+
+    def func(self):
+        "Engage the engines"
+        caller = self.caller
+        speed = 1
+        if self.target:
+            if not self.target.isdigit() or \
+               not 0 < int(self.target) <= navigation.MAX_STEPS:
+                caller.msg("Speed must be a number between 1 and {}".format(
+                    navigation.MAX_STEPS))
+                return
+            speed = int(self.target)
+        ship = self.obj.db.hull
+        if not isinstance(ship, SpaceShipHull):
+            caller.msg("Error locating ship!")
+            return
+        if not isinstance(ship.location, SpaceRoom):
+            caller.msg("Cannot engage ship that is not in space!")
+            return
+        navigation.get_navigation_script().engage(ship, speed)
+        caller.msg("Engines engaged at speed {}.".format(speed))
+
+
+class CmdSSCHalt(Command):
+    """
+    Stop the engines
+
+    Usage:
+        halt
+
+    Stops a ship that was engaged.
+    """
+
+    key = "halt"
+    aliases = ["allstop"]
+    locks = "cmd:all()"
+    help_category = "General"
+
+    def func(self):
+        "Stop the engines"
+        ship = self.obj.db.hull
+        if not isinstance(ship, SpaceShipHull):
+            self.caller.msg("Error locating ship!")
+            return
+        navigation.get_navigation_script().halt(ship)
+        self.caller.msg("Engines stopped.")
+
+
+class CmdSSCScan(Command):
+    """
+    Scan the space around the ship
+
+    Usage:
+        scan [<range>]
+
+    Lists the ships and objects found within <range> systems of the ship,
+        nearest first, and how many celestial bodies of each kind are there.
+        The range defaults to 10.
+    """
+
+    key = "scan"
+    aliases = ["sensors"]
+    locks = "cmd:all()"
+    help_category = "General"
+
+    def parse(self):
+        "Very trivial parser"
+        self.target = self.args.strip()
+
+    def func(self):
+        "List what is around the ship"
+        caller = self.caller
+        radius = SCAN_RADIUS
+        if self.target:
+            if not self.target.isdigit() or \
+               not 0 < int(self.target) <= SCAN_MAX_RADIUS:
+                caller.msg("Scan takes a range between 1 and {}".format(
+                    SCAN_MAX_RADIUS))
+                return
+            radius = int(self.target)
+        ship = self.obj.db.hull
+        if not isinstance(ship, SpaceShipHull):
+            caller.msg("Error locating ship!")
+            return
+        if not isinstance(ship.location, SpaceRoom):
+            caller.msg("Cannot scan from a ship that is not in space!")
+            return
+        space = ship.location.space
+        center = space.get_obj_coordinates(ship)
+
+        objs = [(obj, coordinates) for obj, coordinates
+                in space.get_objs_in_radius(center, radius) if obj != ship]
+        # Only the sectors already generated are read, the others get ready
+        # in the background
+        bodies = space.get_bodies_in_radius(center, radius, ready_only=True)
+        kinds = []
+        by_kind = {}
+        for body, coordinates in bodies:
+            kind = body.__class__.__name__
+            if kind not in by_kind:
+                # Nearest first: the first one found is the nearest
+                kinds.append(kind)
+                by_kind[kind] = [0, coordinates]
+            by_kind[kind][0] += 1
+
+        string = "Within {} systems of {}, {}, {}:".format(radius, *center)
+        if not objs and not kinds:
+            string = "Nothing within {} systems.".format(radius)
+        for obj, coordinates in objs[:SCAN_MAX_OBJECTS]:
+            string += "\n  {} at {}, {}, {}".format(
+                obj.get_display_name(caller), *coordinates)
+        if len(objs) > SCAN_MAX_OBJECTS:
+            string += "\n  ... and {} more".format(
+                len(objs) - SCAN_MAX_OBJECTS)
+        for kind in kinds:
+            count, coordinates = by_kind[kind]
+            string += "\n  {} {}(s), nearest at {}, {}, {}".format(
+                count, kind, *coordinates)
+        sectors = space.sectors
+        if any(key in sectors.pending
+               for key in sectors.sector_keys(box_around(center, radius))):
+            string += "\nSensors are still sweeping part of the range."
+        caller.msg(string)
+
+
 class CmdSSCPort(Command):
     """
     Turn the ship to port, 45 degrees
@@ -187,8 +327,8 @@ class CmdSSCPort(Command):
 
     def func(self):
         "Turn ship to port"
-        self.obj.db.lon = (self.obj.db.lon - 45 + 360) % 360
-        self.caller.msg("The ship is now oriented to {} longitude.".format(self.obj.db.lon))
+        self.obj.lon -= 45
+        self.caller.msg("The ship is now oriented to {} longitude.".format(self.obj.lon))
 
 
 class CmdSSCStarboard(Command):
@@ -213,8 +353,8 @@ class CmdSSCStarboard(Command):
 
     def func(self):
         "Turn ship to starboard"
-        self.obj.db.lon = (self.obj.db.lon + 45) % 360
-        self.caller.msg("The ship is now oriented to {} longitude.".format(self.obj.db.lon))
+        self.obj.lon += 45
+        self.caller.msg("The ship is now oriented to {} longitude.".format(self.obj.lon))
 
 
 class CmdSSCUp(Command):
@@ -239,8 +379,8 @@ class CmdSSCUp(Command):
 
     def func(self):
         "Pitch ship up"
-        self.obj.db.lat = (self.obj.db.lat + 45) % 360
-        self.caller.msg("The ship is now oriented to {} latitude.".format(self.obj.db.lat))
+        self.obj.lat += 45
+        self.caller.msg("The ship is now oriented to {} latitude.".format(self.obj.lat))
 
 
 class CmdSSCDown(Command):
@@ -265,5 +405,5 @@ class CmdSSCDown(Command):
 
     def func(self):
         "Pitch ship down"
-        self.obj.db.lat = (self.obj.db.lat - 45 + 360) % 360
-        self.caller.msg("The ship is now oriented to {} latitude.".format(self.obj.db.lat))
+        self.obj.lat -= 45
+        self.caller.msg("The ship is now oriented to {} latitude.".format(self.obj.lat))
@@ -0,0 +1,48 @@
+from evennia.commands.default.tests import CommandTest
+from commands import spaceshipconsole
+from world import shipyard
+from world import space
+from world.test_resources import SpaceTestMixin
+
+
+class TestSpaceShipConsole(SpaceTestMixin, CommandTest):
+    """
+    Unit tests for the commands of the ship Console.
+
+    Tests:
+     - Scanning the default map lists one line per kind of celestial body
+     - Out of range scans, steps and speeds are refused
+    """
+    def setUp(self):
+        super(TestSpaceShipConsole, self).setUp()
+        space.create_space()
+        self.space = space.get_space()
+        self.hull, self.bridge, self.console = shipyard.create_ship(
+            "ship", (0, 0, 0))
+
+    def test_scan(self):
+        radius = 10
+        # Get the sectors ready, as they would be after the ship's moves
+        self.space.sectors.bodies_in_box(((-radius,) * 3, (radius,) * 3))
+        result = self.call(spaceshipconsole.CmdSSCScan(), str(radius),
+                           obj=self.console)
+        lines = result.splitlines()
+        self.assertEquals(lines[0], "Within {} systems of 0, 0, 0:".format(
+            radius))
+        kinds = set(body.__class__.__name__
+                    for body in self.space.sectors.bodies)
+        self.assertTrue(1 <= len(lines) - 1 <= len(kinds))
+        self.assertIn("Star(s), nearest at", result)
+        # A scan reaches 10 systems by default
+        self.call(spaceshipconsole.CmdSSCScan(), "", "Within 10 systems",
+                  obj=self.console)
+
+    def test_limits(self):
+        self.call(spaceshipconsole.CmdSSCScan(),
+                  str(spaceshipconsole.SCAN_MAX_RADIUS + 1),
+                  "Scan takes a range between 1 and", obj=self.console)
+        self.call(spaceshipconsole.CmdSSCStep(), "100000",
+                  "Step takes a number of steps between 1 and",
+                  obj=self.console)
+        self.call(spaceshipconsole.CmdSSCEngage(), "100000",
+                  "Speed must be a number between 1 and", obj=self.console)
@@ -16,13 +16,16 @@ at_server_cold_stop()
 
 """
 
+from world import space
+
 
 def at_server_start():
     """
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    # Register the space maps, so entering space needs no database lookup
+    space.load_spaces()
 
 
 def at_server_stop():
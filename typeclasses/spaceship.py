@@ -13,21 +13,62 @@ The ship is comprised of at least three components:
 
 It is possible for a ship to have more than one Console, however it may never
     have more than one Hull or Bridge.
+
+What reaches the Hull in space (arrivals, departures, anything said in its
+    space room) is relayed to the interior of the ship: the Bridge, and the
+    rooms listed in the Bridge's `interior` Attribute. The messages received
+    during `RELAY_DELAY` seconds are sent to each room at once.
 """
 
+from django.db.models.signals import post_delete, post_save
 from evennia import DefaultRoom
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils import delay
 from typeclasses.objects import Object
+from world.navigation import HEADING_VECTORS, pack_heading, unpack_heading
 from world.space import SpaceRoom
 
 
+# Keys of the Attributes linking the components of a ship together
+LINK_ATTRIBUTES = ("hull", "bridge", "console", "interior")
+# Seconds during which the messages reaching a Hull are gathered
+RELAY_DELAY = 0.2
+# Prefix of the messages relayed to the interior of a ship
+RELAY_PREFIX = "|c[Outside]|n "
+# Bumped every time a link changes, making the cached integrity checks stale
+_links = {"generation": 0}
+
+
+def _at_link_changed(sender, instance, **kwargs):
+    """
+    Called when any Attribute is saved or deleted.
+    """
+    if instance.db_key in LINK_ATTRIBUTES:
+        _links["generation"] += 1
+
+
+post_save.connect(_at_link_changed, sender=Attribute,
+                  dispatch_uid="spaceship_link_saved")
+post_delete.connect(_at_link_changed, sender=Attribute,
+                    dispatch_uid="spaceship_link_deleted")
+
+
 class SpaceShipBridge(DefaultRoom, Object):
     """
     The Bridge is the main room of the ship. It typically contains a Console,
     although this is not always the case. The Bridge _is_ required for a
     functioning ship. Other rooms may be attached to the Bridge to create a
-    larger ship.
+    larger ship, and listed in its `interior` Attribute to hear what happens
+    outside.
     """
-    pass
+    def get_interior(self):
+        """
+        Returns the rooms of the ship.
+
+        Returns:
+            list: the Bridge followed by the rooms of its `interior` Attribute
+        """
+        return [self] + [room for room in (self.db.interior or []) if room]
 
 
 class SpaceShipConsole(Object):
@@ -43,6 +84,109 @@ class SpaceShipConsole(Object):
         # Add the Command Set for the Console
         self.cmdset.add("spaceshipconsole.SSCCmdSet", permanent=True)
 
+        # The course, packed in a single number (see world/navigation.py)
+        self.db.heading = 0
+
+    @property
+    def heading(self):
+        """
+        The course of the ship, packed in a single number. It is kept in
+        memory once read, and saved whenever it changes.
+
+        Returns:
+            int: the packed heading
+        """
+        if self.ndb.heading is None:
+            heading = self.db.heading
+            if heading is None:
+                # Consoles from before headings were packed
+                heading = pack_heading(self.db.lat or 0, self.db.lon or 0)
+            self.ndb.heading = heading
+        return self.ndb.heading
+
+    @heading.setter
+    def heading(self, heading):
+        self.db.heading = heading
+        self.ndb.heading = heading
+
+    @property
+    def lat(self):
+        """
+        The latitude of the course, in degrees.
+        """
+        return unpack_heading(self.heading)[0]
+
+    @lat.setter
+    def lat(self, lat):
+        self.heading = pack_heading(lat, self.lon)
+
+    @property
+    def lon(self):
+        """
+        The longitude of the course, in degrees.
+        """
+        return unpack_heading(self.heading)[1]
+
+    @lon.setter
+    def lon(self, lon):
+        self.heading = pack_heading(self.lat, lon)
+
+    @property
+    def heading_vector(self):
+        """
+        The (dx, dy, dz) step the ship takes along its course.
+        """
+        return HEADING_VECTORS[self.heading]
+
+    def check_integrity(self):
+        """
+        Checks the links between the Console, the Hull and the Bridge of the
+        ship. The result is kept in memory until one of the `hull`, `bridge`
+        or `console` Attributes of any object changes.
+
+        Returns:
+            list of str: the errors found, empty if the ship is valid
+        """
+        cached = self.ndb.integrity
+        if cached is not None and cached[0] == _links["generation"]:
+            return cached[1]
+        generation = _links["generation"]
+        errors = []
+
+        hull = self.db.hull
+        if not hull:
+            errors.append("Console does not have a Hull specified.")
+        elif not isinstance(hull, SpaceShipHull):
+            errors.append("Console has an invalid Hull specified.")
+        else:
+            # No Hull errors, check Console re: Hull
+            console = hull.db.console
+            if not console:
+                errors.append("Hull does not have a Console specified.")
+            elif not isinstance(console, SpaceShipConsole):
+                errors.append("Hull has an invalid Console specified.")
+            elif console.db.hull != hull:
+                errors.append("Hull's Console specifies a different Hull!'")
+
+        bridge = self.db.bridge
+        if not bridge:
+            errors.append("Console does not have a Bridge specified.")
+        elif not isinstance(bridge, SpaceShipBridge):
+            errors.append("Console has an invalid Bridge specified.")
+        else:
+            # No Bridge errors, check Console re: Bridge
+            console = bridge.db.console
+            if not console:
+                errors.append("Bridge does not have a Console specified.")
+            elif not isinstance(console, SpaceShipConsole):
+                errors.append("Bridge has an invalid Console specified.")
+            elif console.db.bridge != bridge:
+                errors.append(
+                    "Bridge's Console specifies a different Bridge!'")
+
+        self.ndb.integrity = (generation, errors)
+        return errors
+
     def return_appearance(self, looker):
         """
         Called by the look command.
@@ -51,49 +195,16 @@ class SpaceShipConsole(Object):
         string = super(SpaceShipConsole, self).return_appearance(looker)
 
         # Error messages
-        errors = False
-        if not self.db.hull:
-            string += "\n|rERROR:|n Console does not have a Hull specified."
-            errors = True
-        elif not isinstance(self.db.hull, SpaceShipHull):
-            string += "\n|rERROR:|n Console has an invalid Hull specified."
-            errors = True
-        else:
-            # No Hull errors, check Console re: Hull
-            if not self.db.hull.db.console:
-                string += "\n|rERROR:|n Hull does not have a Console specified."
-                errors = True
-            elif not isinstance(self.db.hull.db.console, SpaceShipConsole):
-                string += "\n|rERROR:|n Hull has an invalid Console specified."
-                errors = True
-            elif self.db.hull.db.Console.db.hull != self.db.hull:
-                string += "\n|rERROR:|n Hull's Console specifies a different Hull!'"
-                errors = True
-
-        if not self.db.bridge:
-            string += "\n|rERROR:|n Console does not have a Bridge specified."
-            errors = True
-        elif not isinstance(self.db.bridge, SpaceShipBridge):
-            string += "\n|rERROR:|n Console has an invalid Bridge specified."
-            errors = True
-        else:
-            # No Bridge errors, check Console re: Bridge
-            if not self.db.bridge.db.console:
-                string += "\n|rERROR:|n Bridge does not have a Console specified."
-                errors = True
-            elif not isinstance(self.db.bridge.db.console, SpaceShipConsole):
-                string += "\n|rERROR:|n Bridge has an invalid Console specified."
-                errors = True
-            elif self.db.bridge.db.Console.db.bridge != self.db.bridge:
-                string += "\n|rERROR:|n Bridge's Console specifies a different Bridge!'"
-                errors = True
-
-        # If we had any errors, then exit here
+        errors = self.check_integrity()
         if errors:
+            # If we had any errors, then exit here
+            for error in errors:
+                string += "\n|rERROR:|n " + error
             return string
 
-        if isinstance(self.db.hull.location, SpaceRoom):
-            string += "\nCoordinates: {}".format(self.db.hull.location.coordinates)
+        hull = self.db.hull
+        if isinstance(hull.location, SpaceRoom):
+            string += "\nCoordinates: {}".format(hull.location.coordinates)
         else:
             string += "\nCoordinates: Unknown"
         # Done
@@ -104,4 +215,83 @@ class SpaceShipHull(Object):
     """
     The Hull is the exterior of the ship, and is what travels through space.
     """
-    pass
+    def at_space_move(self, space, coordinates):
+        """
+        Called by the space map after the Hull moved.
+
+        Args:
+            space (SpaceScript): the space map the Hull is in
+            coordinates (tuple): the new (x, y, z) coordinates of the Hull
+        """
+        # Get the sectors ahead of the ship ready before it gets there
+        console = self.console
+        vector = console.heading_vector if console else (0, 0, 0)
+        space.sectors.prefetch_ahead(coordinates, vector)
+
+    @property
+    def console(self):
+        """
+        The Console of the ship. It is kept in memory until one of the links
+        of a ship changes, so that moving the ship doesn't load the Attribute.
+
+        Returns:
+            SpaceShipConsole: the Console, None if the ship has none
+        """
+        cached = self.ndb.console
+        if cached is not None and cached[0] == _links["generation"] and \
+           (cached[1] is None or cached[1].pk):
+            return cached[1]
+        generation = _links["generation"]
+        console = self.db.console
+        self.ndb.console = (generation, console)
+        return console
+
+    @property
+    def interior(self):
+        """
+        The rooms of the ship, found through the Console and the Bridge. They
+        are kept in memory until one of the links of a ship changes.
+
+        Returns:
+            list: the interior rooms, empty if the ship has no Bridge
+        """
+        cached = self.ndb.interior
+        if cached is not None and cached[0] == _links["generation"]:
+            return cached[1]
+        generation = _links["generation"]
+        console = self.console
+        bridge = console.db.bridge if console else None
+        if isinstance(bridge, SpaceShipBridge):
+            rooms = bridge.get_interior()
+        else:
+            rooms = []
+        self.ndb.interior = (generation, rooms)
+        return rooms
+
+    def msg(self, text=None, from_obj=None, session=None, **kwargs):
+        """
+        Relays the messages reaching the Hull to the interior of the ship.
+        They are gathered and sent every `RELAY_DELAY` seconds.
+        """
+        super(SpaceShipHull, self).msg(text=text, from_obj=from_obj,
+                                       session=session, **kwargs)
+        if isinstance(text, tuple):
+            text = text[0]
+        if not text:
+            return
+        if self.ndb.relay_queue is None:
+            self.ndb.relay_queue = []
+            delay(RELAY_DELAY, self.flush_relay)
+        self.ndb.relay_queue.append(text)
+
+    def flush_relay(self):
+        """
+        Sends the gathered messages to every room of the ship, with one
+        message per room.
+        """
+        queue, self.ndb.relay_queue = self.ndb.relay_queue, None
+        if not queue or not self.pk:
+            return
+        text = "\n".join(RELAY_PREFIX + line for line in queue)
+        for room in self.interior:
+            room.msg_contents(text)
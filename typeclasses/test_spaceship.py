@@ -0,0 +1,71 @@
+from evennia import create_object
+from evennia.utils.test_resources import EvenniaTest
+from typeclasses.spaceship import SpaceShipBridge, SpaceShipConsole
+from typeclasses.spaceship import SpaceShipHull
+
+
+class TestSpaceShip(EvenniaTest):
+    """
+    Unit tests for the components of a ship.
+
+    Tests:
+     - A fully linked ship has no integrity errors
+     - The integrity check is cached until a link changes
+     - The Hull keeps its Console in memory until a link changes
+     - Messages reaching the Hull are relayed to the interior at once
+    """
+    def setUp(self):
+        super(TestSpaceShip, self).setUp()
+        self.bridge = create_object(SpaceShipBridge, key="bridge")
+        self.hull = create_object(SpaceShipHull, key="hull")
+        self.console = create_object(SpaceShipConsole, key="console",
+                                     location=self.bridge)
+        self.console.db.hull = self.hull
+        self.console.db.bridge = self.bridge
+        self.hull.db.console = self.console
+        self.bridge.db.console = self.console
+
+    def test_integrity(self):
+        self.assertEquals(self.console.check_integrity(), [])
+        self.assertIn("Coordinates",
+                      self.console.return_appearance(self.char1))
+
+    def test_integrity_cache(self):
+        errors = self.console.check_integrity()
+        self.assertIs(self.console.check_integrity(), errors)
+
+        # Changing any link makes the check run again
+        self.hull.db.console = self.obj1
+        self.assertEquals(self.console.check_integrity(),
+                          ["Hull has an invalid Console specified."])
+        del self.bridge.db.console
+        self.assertEquals(self.console.check_integrity(),
+                          ["Hull has an invalid Console specified.",
+                           "Bridge does not have a Console specified."])
+        self.hull.db.console = self.console
+        self.bridge.db.console = self.console
+        self.assertEquals(self.console.check_integrity(), [])
+
+    def test_hull_console(self):
+        self.assertEquals(self.hull.console, self.console)
+        self.assertEquals(self.hull.ndb.console[1], self.console)
+        other = create_object(SpaceShipConsole, key="other")
+        self.hull.db.console = other
+        self.assertEquals(self.hull.console, other)
+        del self.hull.db.console
+        self.assertIsNone(self.hull.console)
+
+    def test_relay(self):
+        cabin = create_object(SpaceShipBridge, key="cabin")
+        self.bridge.db.interior = [cabin]
+        self.assertEquals(self.hull.interior, [self.bridge, cabin])
+
+        received = []
+        self.bridge.msg_contents = lambda text: received.append(("bridge", text))
+        cabin.msg_contents = lambda text: received.append(("cabin", text))
+        self.hull.msg("A ship arrives.")
+        self.hull.msg(("A ship leaves.", {}))
+        self.assertEquals(received, [])
+        self.hull.flush_relay()
+        text = "|c[Outside]|n A ship arrives.\n|c[Outside]|n A ship leaves."
+        self.assertEquals(received, [("bridge", text), ("cabin", text)])
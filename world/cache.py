@@ -0,0 +1,118 @@
+"""
+Cache
+
+Small caching helpers shared by the space systems.
+
+LRUCache is a bounded mapping that forgets the least recently used entries
+first and counts its hits and misses, so that caches can be tuned from the
+game.
+"""
+
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """
+    A bounded least-recently-used cache.
+
+    Every read through `get` counts as a hit or a miss. Storing a value when
+    the cache is full evicts the entry that was used the longest time ago.
+    """
+    def __init__(self, maxsize=1024):
+        """
+        Args:
+            maxsize (int, optional): the maximum number of entries to keep
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, marking it as recently used.
+
+        Args:
+            key (hashable): the key to look up
+            default (any, optional): returned if key is not cached
+
+        Returns:
+            The cached value, or default
+        """
+        value = self._data.pop(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Caches value for key, evicting the least recently used entries if
+        the cache is full.
+
+        Args:
+            key (hashable): the key to store value under
+            value (any): the value to cache
+        """
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def touch(self, key):
+        """
+        Marks key as recently used, without counting a hit or a miss.
+
+        Args:
+            key (hashable): the key to refresh
+
+        Returns:
+            bool: True if key is cached
+        """
+        value = self._data.pop(key, _MISSING)
+        if value is _MISSING:
+            return False
+        self._data[key] = value
+        return True
+
+    def invalidate(self, key=_MISSING):
+        """
+        Forgets the value cached for key. Without a key, the whole cache is
+        emptied.
+
+        Args:
+            key (hashable, optional): the key to forget
+        """
+        if key is _MISSING:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self):
+        """
+        Returns statistics about the cache.
+
+        Returns:
+            dict: with the keys `size`, `maxsize`, `hits`, `misses`,
+                `evictions` and `hit_rate` (between 0 and 1)
+        """
+        lookups = self.hits + self.misses
+        return {"size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": float(self.hits) / lookups if lookups else 0.0}
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,353 @@
+"""
+Grid Map
+
+Map providers for the space and wilderness systems that are backed by a
+precompiled grid instead of parsing a map on every call.
+
+Usage:
+
+    A map is drawn as text, one character per location. The last line of the
+    map is `y == 0` and the first column is `x == 0`, like in the pyramid
+    example of `world/space.py`. The map is compiled once into a compact
+    grid of bytes: checking if coordinates are valid or looking up the
+    terrain is then a single index into that grid.
+
+    ```python
+    map_str = \"\"\"
+         .
+        ...
+       .....
+      .......
+    \"\"\"
+
+    from world import gridmap, space
+
+    class PyramidMapProvider(gridmap.SpaceGridMapProvider):
+        grid = gridmap.GridMap.from_string(map_str)
+        terrain_names = {".": "Inside a pyramid."}
+
+    space.create_space(mapprovider=PyramidMapProvider())
+    ```
+
+    Large maps can be kept in a file and loaded with `GridMap.from_file`.
+    When every line of the file has the same length the file is memory
+    mapped instead of read, so only the parts of the map that are visited
+    are loaded in memory.
+
+    The 3D `SpaceGridMapProvider` maps the grid on the `z == 0` plane by
+    default. Several planes can be given with the `layers` attribute, a
+    dictionary of `{z: GridMap}`. The 2D `WildernessGridMapProvider` uses the
+    grid as is.
+"""
+
+import mmap
+import os
+from world.space import SpaceMapProvider
+from world.wilderness import WildernessMapProvider
+
+
+class GridMap(object):
+    """
+    A 2D map of terrain characters stored as one byte per location.
+    """
+    def __init__(self, data, width, height, stride=None, origin=(0, 0),
+                 path=None):
+        """
+        Use `GridMap.from_string`, `GridMap.from_rows` or `GridMap.from_file`
+        instead of creating a GridMap directly.
+
+        Args:
+            data (bytearray or mmap): the rows of the map, top row first
+            width (int): the number of columns of the map
+            height (int): the number of rows of the map
+            stride (int, optional): the number of bytes from the start of a
+                row to the next one. Defaults to width.
+            origin (tuple, optional): the (x, y) coordinates of the bottom
+                left corner of the map
+            path (str, optional): the file data is mapped from
+        """
+        self._data = data
+        self.width = width
+        self.height = height
+        self._stride = stride or width
+        self.origin = tuple(origin)
+        self.path = path
+
+    @classmethod
+    def from_rows(cls, rows, origin=(0, 0), blank=" "):
+        """
+        Compiles a map from a list of rows.
+
+        Args:
+            rows (list of str): the rows of the map, top row first. Shorter
+                rows are padded with blank.
+            origin (tuple, optional): the (x, y) coordinates of the bottom
+                left corner of the map
+            blank (str, optional): the character used for padding
+
+        Returns:
+            GridMap: the compiled map
+        """
+        width = max(len(row) for row in rows) if rows else 0
+        data = bytearray(
+            "".join(row.ljust(width, blank) for row in rows), "latin-1")
+        return cls(data, width, len(rows), origin=origin)
+
+    @classmethod
+    def from_string(cls, map_str, origin=(0, 0), blank=" "):
+        """
+        Compiles a map from a string. Empty lines at the start and the end of
+        the string are ignored.
+
+        Args:
+            map_str (str): the map, one line per row
+            origin (tuple, optional): the (x, y) coordinates of the bottom
+                left corner of the map
+            blank (str, optional): the character used for padding
+
+        Returns:
+            GridMap: the compiled map
+        """
+        return cls.from_rows(map_str.strip("\n").split("\n"), origin=origin,
+                             blank=blank)
+
+    @classmethod
+    def from_file(cls, path, origin=(0, 0), use_mmap=True):
+        """
+        Loads a map from a text file. If every line of the file has the same
+        length the file is memory mapped, otherwise it is read and compiled
+        like a string.
+
+        Args:
+            path (str): the path of the map file
+            origin (tuple, optional): the (x, y) coordinates of the bottom
+                left corner of the map
+            use_mmap (bool, optional): set to False to always read the file
+
+        Returns:
+            GridMap: the loaded map
+        """
+        with open(path, "rb") as map_file:
+            if use_mmap:
+                data = cls._mmap(map_file)
+                if data is not None:
+                    return cls(data[0], data[1], data[2], stride=data[3],
+                               origin=origin, path=path)
+            map_file.seek(0)
+            rows = map_file.read().decode("latin-1").splitlines()
+        return cls.from_rows(rows, origin=origin)
+
+    @staticmethod
+    def _mmap(map_file):
+        """
+        Memory maps a map file made of lines of the same length.
+
+        Returns:
+            (mmap, width, height, stride), or None if the file can't be
+                mapped
+        """
+        first = map_file.readline()
+        width = len(first.rstrip(b"\r\n"))
+        stride = len(first)
+        size = os.fstat(map_file.fileno()).st_size
+        if not width or stride == width:
+            return None
+        height, rest = divmod(size, stride)
+        if rest == width:
+            # The last line has no line break
+            height += 1
+        elif rest:
+            return None
+        data = mmap.mmap(map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        for row in range(height - 1):
+            if data[row * stride + stride - 1] != first[-1]:
+                data.close()
+                return None
+        return data, width, height, stride
+
+    def __getstate__(self):
+        # A memory mapped file can't be pickled: keep its path instead
+        state = self.__dict__.copy()
+        if self.path:
+            del state["_data"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path:
+            loaded = GridMap.from_file(self.path, origin=self.origin)
+            self.__dict__.update(loaded.__dict__)
+
+    def get_code(self, x, y):
+        """
+        Returns the byte stored at the coordinates.
+
+        Args:
+            x (int): the x coordinate
+            y (int): the y coordinate
+
+        Returns:
+            int: the byte at (x, y), or -1 if outside of the map
+        """
+        column = x - self.origin[0]
+        row = self.height - 1 - (y - self.origin[1])
+        if 0 <= column < self.width and 0 <= row < self.height:
+            code = self._data[row * self._stride + column]
+            # Memory mapped files give one character strings on Python 2
+            return code if isinstance(code, int) else ord(code)
+        return -1
+
+    def get_terrain(self, x, y):
+        """
+        Returns the terrain character at the coordinates.
+
+        Args:
+            x (int): the x coordinate
+            y (int): the y coordinate
+
+        Returns:
+            str: the character at (x, y), or None if outside of the map
+        """
+        code = self.get_code(x, y)
+        if code < 0:
+            return None
+        return chr(code)
+
+
+class GridMapProviderMixin(object):
+    """
+    Shared implementation of the grid backed map providers.
+
+    Attributes:
+        walkable (str): the terrain characters that can be travelled to
+        terrain_names (dict): the location name of each terrain character
+        default_name (str): the location name of terrain missing from
+            terrain_names
+    """
+    walkable = "."
+    terrain_names = {}
+    default_name = "Unknown"
+    # The map does not change once compiled
+    pure_coordinates = True
+
+    def _lookup_tables(self):
+        """
+        Returns the walkable and name lookup tables, indexed by byte. They
+        are built on first use.
+        """
+        tables = self.__dict__.get("_tables")
+        if tables is None:
+            walkable = bytearray(256)
+            for char in self.walkable:
+                walkable[ord(char)] = 1
+            names = [self.default_name] * 256
+            for char, name in self.terrain_names.items():
+                names[ord(char)] = name
+            tables = (walkable, tuple(names))
+            self.__dict__["_tables"] = tables
+        return tables
+
+    def __getstate__(self):
+        # The lookup tables are rebuilt after unpickling
+        state = self.__dict__.copy()
+        state.pop("_tables", None)
+        return state
+
+    def _get_code(self, coordinates):
+        """
+        Returns the byte of the grid at coordinates. This is an abstract
+        method: every provider using this mixin implements it for its own
+        kind of coordinates.
+
+        Args:
+            coordinates (tuple): the coordinates to look up
+
+        Returns:
+            int: the byte at coordinates, or -1 if outside of the map
+        """
+        raise NotImplementedError(
+            "{} must implement _get_code".format(type(self).__name__))
+
+    def get_terrain(self, coordinates):
+        """
+        Returns the terrain character at coordinates.
+
+        Args:
+            coordinates (tuple): the coordinates to look up
+
+        Returns:
+            str: the terrain character, or None if outside of the map
+        """
+        code = self._get_code(coordinates)
+        if code < 0:
+            return None
+        return chr(code)
+
+    def is_valid_coordinates(self, space, coordinates):
+        """
+        Returns True if the terrain at coordinates can be walked to.
+
+        Args:
+            space: the space (or wilderness) script
+            coordinates (tuple): the coordinates to check
+
+        Returns:
+            bool: True if the coordinates are valid
+        """
+        code = self._get_code(coordinates)
+        return code >= 0 and bool(self._lookup_tables()[0][code])
+
+    def get_location_name(self, coordinates):
+        """
+        Returns the name of the terrain at coordinates.
+
+        Args:
+            coordinates (tuple): the coordinates to name
+
+        Returns:
+            name (str)
+        """
+        code = self._get_code(coordinates)
+        if code < 0:
+            return self.default_name
+        return self._lookup_tables()[1][code]
+
+
+class SpaceGridMapProvider(GridMapProviderMixin, SpaceMapProvider):
+    """
+    Space map provider backed by GridMaps, one per `z` plane.
+
+    Attributes:
+        grid (GridMap): the map of the `z == 0` plane
+        layers (dict): `{z: GridMap}`, used instead of grid when set
+    """
+    grid = None
+    layers = None
+
+    def _get_code(self, coordinates):
+        x, y, z = coordinates
+        if self.layers is not None:
+            grid = self.layers.get(z)
+        elif z == 0:
+            grid = self.grid
+        else:
+            grid = None
+        if grid is None:
+            return -1
+        return grid.get_code(x, y)
+
+
+class WildernessGridMapProvider(GridMapProviderMixin, WildernessMapProvider):
+    """
+    Wilderness map provider backed by a GridMap.
+
+    Attributes:
+        grid (GridMap): the map of the wilderness
+    """
+    grid = None
+
+    def _get_code(self, coordinates):
+        if self.grid is None:
+            return -1
+        x, y = coordinates
+        return self.grid.get_code(x, y)
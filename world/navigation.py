@@ -0,0 +1,319 @@
+"""
+Navigation
+
+Ship movement through space.
+
+Usage:
+
+    A ship is steered with the latitude and longitude of its Console (see
+    `commands/spaceshipconsole.py`). `heading_vector` turns them into the
+    (dx, dy, dz) step the ship takes along each axis, and `move_ship` moves
+    the ship's Hull a number of steps along that course.
+
+    ```python
+    from world import navigation
+    navigation.move_ship(console.db.hull, navigation.heading_vector(0, 90), 10)
+    ```
+
+    As courses are set in steps of 45 degrees, a Console keeps its course
+    packed in a single number (see `pack_heading`) and looks its step up in
+    the precomputed `HEADING_VECTORS` table.
+
+    Ships can also travel on their own: once engaged, a ship advances along
+    its course on every tick of the navigation script, until it is halted.
+
+    ```python
+    navigation.get_navigation_script().engage(console.db.hull, speed=2)
+    ```
+
+Implementation:
+
+    A course of several steps is plotted in one pass: the coordinates along
+    the way are only checked against the map, then the Hull is moved straight
+    to the end of the course. Only the rooms at the start and the end of the
+    course are touched, whatever the distance. In open space (see
+    `SpaceScript.open_space`) nothing can block the course, so the
+    coordinates along the way are not checked at all. A course is at most
+    `MAX_STEPS` long.
+
+    A single global script (`NavigationScript`) moves every engaged ship. On
+    each tick the ships are grouped by space map, and the positions of all
+    the ships of a map are saved together at the end of the tick. A Hull is
+    halted when it is deleted.
+"""
+
+from django.db.models.signals import pre_delete
+from evennia import create_script
+from evennia.utils import inherits_from
+from typeclasses.scripts import Script
+from world.space import SpaceRoom
+
+
+# Key of the global navigation script
+NAVIGATION_KEY = "navigation"
+# Seconds between two steps of the engaged ships
+NAVIGATION_INTERVAL = 2
+# Courses are set in steps of 45 degrees: 8 latitudes by 8 longitudes
+HEADING_STEP = 45
+HEADING_COUNT = 360 // HEADING_STEP
+# Most steps a ship can take at once, in one course or one tick
+MAX_STEPS = 100
+
+
+def heading_vector(lat, lon):
+    """
+    Returns the step taken along each axis by a ship heading towards lat and
+    lon.
+
+    Args:
+        lat (int): the latitude of the course, in degrees
+        lon (int): the longitude of the course, in degrees
+
+    Returns:
+        tuple: (dx, dy, dz), each one of -1, 0 or 1
+    """
+    x = 0
+    y = 0
+    z = 0
+    # Lat == 0 or Lat == 180: Ship upside down re ecliptic
+    if lat > 0 and lat < 180:
+        z = 1
+    if lat > 180 and lat < 360:
+        z = -1
+    if lon > 270 or lon < 90:
+        y = 1
+    if lon > 90 and lon < 270:
+        y = -1
+    if lon > 0 and lon < 180:
+        x = 1
+    if lon > 180 and lon < 360:
+        x = -1
+    return (x, y, z)
+
+
+def pack_heading(lat, lon):
+    """
+    Packs a course into a single heading number.
+
+    Args:
+        lat (int): the latitude of the course, a multiple of 45 degrees
+        lon (int): the longitude of the course, a multiple of 45 degrees
+
+    Returns:
+        int: the heading, between 0 and 63
+    """
+    return ((lat % 360) // HEADING_STEP) * HEADING_COUNT + \
+        (lon % 360) // HEADING_STEP
+
+
+def unpack_heading(heading):
+    """
+    Returns the course of a heading packed by `pack_heading`.
+
+    Args:
+        heading (int): the packed heading
+
+    Returns:
+        tuple: (lat, lon) in degrees
+    """
+    lat, lon = divmod(heading, HEADING_COUNT)
+    return lat * HEADING_STEP, lon * HEADING_STEP
+
+
+# The (dx, dy, dz) step of every packed heading
+HEADING_VECTORS = tuple(
+    heading_vector(*unpack_heading(heading))
+    for heading in range(HEADING_COUNT * HEADING_COUNT))
+
+
+def plot_course(space, start, vector, steps):
+    """
+    Works out how far a course can go. The course stops before the first
+    coordinates that are not valid in the space map. No room is used.
+
+    Args:
+        space (SpaceScript): the space map to travel through
+        start (tuple): the (x, y, z) coordinates the course starts from
+        vector (tuple): the (dx, dy, dz) step taken along each axis
+        steps (int): the number of steps to take, at most `MAX_STEPS`
+
+    Returns:
+        tuple: ((x, y, z), steps), the coordinates the course ends at and
+            the number of steps that could be taken
+    """
+    steps = min(steps, MAX_STEPS)
+    x, y, z = start
+    dx, dy, dz = vector
+    if space.open_space:
+        return (x + dx * steps, y + dy * steps, z + dz * steps), steps
+    is_valid = space.is_valid_coordinates
+    for taken in range(steps):
+        if not is_valid((x + dx, y + dy, z + dz)):
+            return (x, y, z), taken
+        x += dx
+        y += dy
+        z += dz
+    return (x, y, z), steps
+
+
+def move_ship(hull, vector, steps=1):
+    """
+    Moves a ship's Hull through space along a course.
+
+    Args:
+        hull (SpaceShipHull): the Hull of the ship, inside a space map
+        vector (tuple): the (dx, dy, dz) step taken along each axis
+        steps (int, optional): the number of steps to take
+
+    Returns:
+        tuple: ((x, y, z), steps), the coordinates the Hull ended at and the
+            number of steps it took
+    """
+    space = hull.location.space
+    start = space.get_obj_coordinates(hull)
+    end, taken = plot_course(space, start, vector, steps)
+    if taken and not space.traverse_obj(hull, end):
+        return start, 0
+    return end, taken
+
+
+def get_navigation_script():
+    """
+    Returns the global navigation script, creating it if needed.
+
+    Returns:
+        NavigationScript: the navigation script
+    """
+    script = NavigationScript.objects.filter(db_key=NAVIGATION_KEY).first()
+    if not script:
+        script = create_script(NavigationScript, key=NAVIGATION_KEY)
+    return script
+
+
+class NavigationScript(Script):
+    """
+    Moves every engaged ship along its course, once per tick.
+    """
+
+    def at_script_creation(self):
+        """
+        Only called once, when the script is created. This is a default Evennia
+        hook.
+        """
+        self.persistent = True
+        self.interval = NAVIGATION_INTERVAL
+        self.start_delay = True
+
+        # The engaged ships. Key: Hull, Value: speed in steps per tick
+        self.db.ships = {}
+
+    def at_start(self):
+        """
+        Called when the script is started and also after server reloads.
+        """
+        self.ndb.ships = None
+
+    @property
+    def ships(self):
+        """
+        Returns the engaged ships. This is an in-memory copy of the `ships`
+        Attribute, so ticks don't need to load the Attribute.
+
+        Returns:
+            {hull: speed}
+        """
+        if self.ndb.ships is None:
+            self.ndb.ships = dict((hull, speed) for hull, speed
+                                  in self.db.ships.items() if hull)
+        return self.ndb.ships
+
+    def engage(self, hull, speed=1):
+        """
+        Makes a ship advance along its course on every tick.
+
+        Args:
+            hull (SpaceShipHull): the Hull of the ship
+            speed (int, optional): the number of steps taken every tick, at
+                most `MAX_STEPS`
+        """
+        speed = min(speed, MAX_STEPS)
+        self.ships[hull] = speed
+        self.db.ships[hull] = speed
+
+    def halt(self, hull):
+        """
+        Stops a ship.
+
+        Args:
+            hull (SpaceShipHull): the Hull of the ship
+        """
+        if not hull.pk:
+            # A deleted Hull can't be hashed any more: drop it by identity,
+            # along with the None type 'ghosts' it left in the Attribute
+            self.ndb.ships = dict((ship, speed) for ship, speed
+                                  in self.ships.items() if ship is not hull)
+            self.db.ships = dict((ship, speed) for ship, speed
+                                 in self.db.ships.items()
+                                 if ship is not None and ship.pk)
+            return
+        self.ships.pop(hull, None)
+        if hull in self.db.ships:
+            del self.db.ships[hull]
+        if None in self.db.ships:
+            # Ships deleted while engaged leave None type 'ghosts'
+            del self.db.ships[None]
+
+    def at_repeat(self):
+        """
+        Called every `interval` seconds.
+        """
+        self.advance()
+
+    def advance(self):
+        """
+        Moves every engaged ship along its course. Ships are grouped by space
+        map, so that the positions of a map are saved once per tick.
+        """
+        by_space = {}
+        for hull, speed in list(self.ships.items()):
+            if not hull.pk or not isinstance(hull.location, SpaceRoom):
+                # The ship was destroyed or left space
+                self.halt(hull)
+                continue
+            by_space.setdefault(hull.location.space, []).append((hull, speed))
+
+        for space, ships in by_space.items():
+            with space.itemcoordinates.batch():
+                for hull, speed in ships:
+                    self._advance_ship(hull, speed)
+
+    def _advance_ship(self, hull, speed):
+        """
+        Moves one ship along its course, halting it if the course is blocked.
+        """
+        console = hull.console
+        if not console:
+            self.halt(hull)
+            return
+        coordinates, taken = move_ship(hull, console.heading_vector, speed)
+        if taken < speed:
+            self.halt(hull)
+            if console.location:
+                console.location.msg_contents(
+                    "The ship's course is blocked, the engines stop.")
+
+
+def _at_object_delete(sender, instance, **kwargs):
+    """
+    Called when any object is about to be deleted: halts deleted Hulls.
+    """
+    if not inherits_from(instance, "typeclasses.spaceship.SpaceShipHull"):
+        return
+    script = NavigationScript.objects.filter(db_key=NAVIGATION_KEY).first()
+    if script and instance in script.ships:
+        script.halt(instance)
+
+
+# Typeclasses are proxy models sending the signal as themselves: no sender
+# filter
+pre_delete.connect(_at_object_delete, dispatch_uid="navigation_object_delete")
@@ -0,0 +1,294 @@
+"""
+Sectors
+
+Space is split in cubic sectors of `SECTOR_SIZE` coordinates along each axis.
+The contents of a sector (the stars, planets and moons of
+`world/spaceobject.py`) are generated for the whole sector at once, and kept
+in a cache.
+
+Usage:
+
+    Every space map has a SectorGenerator, `SpaceScript.sectors`. Map
+    providers can use it from `at_prepare_room` to know what is at the
+    coordinates of a room:
+
+    ```python
+    def at_prepare_room(self, coordinates, caller, room):
+        bodies = room.space.sectors.bodies_at(coordinates)
+    ```
+
+    Ships ask for their sector and the next one along their course to be
+    generated in the background every time they move (see
+    `SpaceShipHull.at_space_move`), so the sector is usually ready by the
+    time a ship arrives. When it is not, it is generated on the spot. Only
+    asking for the sectors ahead keeps the number of sectors each ship needs
+    small, so that many ships fit in the cache.
+
+Implementation:
+
+    Sectors are generated in the reactor's thread pool, off the reactor
+    thread. Generating a sector only reads the bodies and does not touch the
+    database, and the results are stored from the reactor thread once they
+    are ready.
+"""
+
+from twisted.internet import threads
+from evennia.utils import logger
+from world.cache import LRUCache
+from world.spaceobject import Star, Planet, Moon, bodies_in_region
+
+
+# Size of a sector along each axis
+SECTOR_SIZE = 16
+# Number of sectors kept in memory for each space map
+SECTOR_CACHE_SIZE = 256
+
+
+def default_bodies():
+    """
+    Returns the celestial bodies found in space by default.
+
+    Returns:
+        list of SpaceObject: a Star, a Planet and a Moon
+    """
+    return [Star(), Planet(), Moon()]
+
+
+class Sector(object):
+    """
+    The generated contents of one sector.
+    """
+    def __init__(self, key, bounds, contents):
+        """
+        Args:
+            key (tuple): the (x, y, z) index of the sector
+            bounds (tuple): the corners of the sector as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+            contents (dict): `{(x, y, z): [body, ...]}`, the bodies present
+                at each coordinates of the sector
+        """
+        self.key = key
+        self.bounds = bounds
+        self.contents = contents
+
+    def bodies_at(self, coordinates):
+        """
+        Returns the bodies present at coordinates.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates inside this sector
+
+        Returns:
+            list of SpaceObject: the bodies present there
+        """
+        return self.contents.get(tuple(coordinates), [])
+
+
+class SectorGenerator(object):
+    """
+    Generates and caches the sectors of a space map.
+    """
+    def __init__(self, bodies=None, size=SECTOR_SIZE,
+                 maxsize=SECTOR_CACHE_SIZE):
+        """
+        Args:
+            bodies (list of SpaceObject, optional): the bodies to place in
+                the sectors. Defaults to `default_bodies()`.
+            size (int, optional): the size of a sector along each axis
+            maxsize (int, optional): the number of sectors kept in memory
+        """
+        self.bodies = default_bodies() if bodies is None else bodies
+        self.size = size
+        self.cache = LRUCache(maxsize=maxsize)
+        # Sectors being generated in the background, key: sector key,
+        # value: Deferred
+        self.pending = {}
+
+    def sector_key(self, coordinates):
+        """
+        Returns the key of the sector holding coordinates.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+
+        Returns:
+            tuple: the (x, y, z) index of the sector
+        """
+        x, y, z = coordinates
+        size = self.size
+        return (x // size, y // size, z // size)
+
+    def sector_bounds(self, key):
+        """
+        Returns the corners of a sector.
+
+        Args:
+            key (tuple): the (x, y, z) index of the sector
+
+        Returns:
+            tuple: ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+        """
+        size = self.size
+        corner = (key[0] * size, key[1] * size, key[2] * size)
+        return corner, (corner[0] + size - 1, corner[1] + size - 1,
+                        corner[2] + size - 1)
+
+    def generate(self, key):
+        """
+        Generates the contents of a sector. This does not use the cache and
+        is safe to call from any thread.
+
+        Args:
+            key (tuple): the (x, y, z) index of the sector
+
+        Returns:
+            Sector: the generated sector
+        """
+        bounds = self.sector_bounds(key)
+        contents = {}
+        for body, found in bodies_in_region(self.bodies, bounds):
+            for coordinates in found:
+                contents.setdefault(coordinates, []).append(body)
+        return Sector(key, bounds, contents)
+
+    def get_sector(self, coordinates):
+        """
+        Returns the sector holding coordinates, generating it right away if
+        it is not ready yet.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+
+        Returns:
+            Sector: the sector
+        """
+        key = self.sector_key(coordinates)
+        sector = self.cache.get(key)
+        if sector is None:
+            sector = self.generate(key)
+            self.cache.set(key, sector)
+        return sector
+
+    def is_ready(self, coordinates):
+        """
+        Returns True if the sector holding coordinates is already generated.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+
+        Returns:
+            bool: True if the sector is in the cache
+        """
+        return self.sector_key(coordinates) in self.cache
+
+    def bodies_at(self, coordinates):
+        """
+        Returns the bodies present at coordinates.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+
+        Returns:
+            list of SpaceObject: the bodies present there
+        """
+        return self.get_sector(coordinates).bodies_at(coordinates)
+
+    def sector_keys(self, bounds):
+        """
+        Returns the keys of the sectors overlapping a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            list of tuple: the (x, y, z) indexes of the sectors
+        """
+        low = self.sector_key(bounds[0])
+        high = self.sector_key(bounds[1])
+        return [(cx, cy, cz)
+                for cx in range(low[0], high[0] + 1)
+                for cy in range(low[1], high[1] + 1)
+                for cz in range(low[2], high[2] + 1)]
+
+    def bodies_in_box(self, bounds, ready_only=False):
+        """
+        Returns the bodies present inside a box. Only the coordinates inside
+        the box are looked up in the sectors it overlaps.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+            ready_only (bool, optional): if True, the sectors not generated
+                yet are skipped and generated in the background, instead of
+                being generated right away
+
+        Returns:
+            list: `[(SpaceObject, (x, y, z)), ...]`
+        """
+        (xmin, ymin, zmin), (xmax, ymax, zmax) = bounds
+        found = []
+        for key in self.sector_keys(bounds):
+            if ready_only:
+                sector = self.cache.get(key)
+                if sector is None:
+                    self.prefetch(key)
+                    continue
+            else:
+                sector = self.get_sector(self.sector_bounds(key)[0])
+            (sxmin, symin, szmin), (sxmax, symax, szmax) = sector.bounds
+            contents = sector.contents
+            for x in range(max(xmin, sxmin), min(xmax, sxmax) + 1):
+                for y in range(max(ymin, symin), min(ymax, symax) + 1):
+                    for z in range(max(zmin, szmin), min(zmax, szmax) + 1):
+                        bodies = contents.get((x, y, z))
+                        if bodies:
+                            found.extend((body, (x, y, z)) for body in bodies)
+        return found
+
+    def prefetch(self, key):
+        """
+        Starts generating a sector in the background, unless it is already
+        generated or being generated.
+
+        Args:
+            key (tuple): the (x, y, z) index of the sector
+        """
+        if key in self.pending or self.cache.touch(key):
+            # Already on its way, or ready: keep it from being evicted
+            return
+        deferred = threads.deferToThread(self.generate, key)
+        deferred.addCallbacks(self._at_generated, self._at_failed,
+                              errbackArgs=(key,))
+        self.pending[key] = deferred
+
+    def prefetch_ahead(self, coordinates, vector):
+        """
+        Starts generating the sector holding coordinates and the next sector
+        along a course in the background.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+            vector (tuple): the (dx, dy, dz) step of the course, each one of
+                -1, 0 or 1
+        """
+        key = self.sector_key(coordinates)
+        self.prefetch(key)
+        if any(vector):
+            self.prefetch((key[0] + vector[0], key[1] + vector[1],
+                           key[2] + vector[2]))
+
+    def _at_generated(self, sector):
+        """
+        Called in the reactor thread when a sector was generated.
+        """
+        self.pending.pop(sector.key, None)
+        self.cache.set(sector.key, sector)
+
+    def _at_failed(self, failure, key):
+        """
+        Called in the reactor thread when a sector could not be generated.
+        """
+        self.pending.pop(key, None)
+        logger.log_err("Generating sector {} failed: {}".format(
+            key, failure.getErrorMessage()))
@@ -0,0 +1,121 @@
+"""
+Shipyard
+
+Builds complete ships: a Bridge, a Console and a Hull, linked together (see
+`typeclasses/spaceship.py`).
+
+Usage:
+
+    ```python
+    from world import shipyard
+    hull, bridge, console = shipyard.create_ship("Enterprise")
+    ```
+
+    The Hull can be placed in a space map right away, and a whole fleet can
+    be built in one call:
+
+    ```python
+    ships = shipyard.create_fleet(
+        ["Red {}".format(num) for num in range(1, 13)],
+        coordinates=[(num, 0, 0) for num in range(12)])
+    ```
+
+Implementation:
+
+    Every component of every ship, and the Attributes linking them, are
+    created inside a single database transaction. The fleet is then placed in
+    space with a single `SpaceScript.move_objs` call: Hulls sharing
+    coordinates share a room, prepared once. If anything fails, the
+    transaction is rolled back, and the space map and the objects created
+    forget what they kept in memory along with it.
+"""
+
+from django.db import transaction
+from evennia import create_object
+from typeclasses.spaceship import SpaceShipBridge, SpaceShipConsole
+from typeclasses.spaceship import SpaceShipHull
+from world.space import get_space
+
+
+def _build_ship(key, created):
+    """
+    Creates and links the components of one ship. Must be called inside a
+    transaction. Every object created is added to the created list.
+    """
+    bridge = create_object(SpaceShipBridge, key="{} Bridge".format(key))
+    created.append(bridge)
+    console = create_object(SpaceShipConsole, key="Console", location=bridge)
+    created.append(console)
+    hull = create_object(SpaceShipHull, key=key)
+    created.append(hull)
+    console.db.hull = hull
+    console.db.bridge = bridge
+    hull.db.console = console
+    bridge.db.console = console
+    return hull, bridge, console
+
+
+def create_ship(key, coordinates=None, name="space"):
+    """
+    Creates a ship.
+
+    Args:
+        key (str): the name of the ship, given to its Hull
+        coordinates (tuple, optional): the (x, y, z) coordinates to place the
+            Hull at. If not provided, the Hull is left outside of space.
+        name (str, optional): the name of the space map to place the Hull in
+
+    Returns:
+        tuple: (hull, bridge, console), the components of the ship
+    """
+    return create_fleet([key], None if coordinates is None else [coordinates],
+                        name=name)[0]
+
+
+def create_fleet(keys, coordinates=None, name="space"):
+    """
+    Creates several ships at once.
+
+    Args:
+        keys (list of str): the names of the ships, one per ship
+        coordinates (list of tuple, optional): the (x, y, z) coordinates to
+            place each Hull at, in the same order as keys. If not provided,
+            the Hulls are left outside of space.
+        name (str, optional): the name of the space map to place the Hulls in
+
+    Returns:
+        list of tuple: (hull, bridge, console) for each ship
+
+    Raises:
+        ValueError: if there are not as many coordinates as keys, or if some
+            coordinates are not valid in the space map. Nothing is created
+            then.
+    """
+    space = None
+    if coordinates is not None:
+        coordinates = [tuple(coords) for coords in coordinates]
+        if len(coordinates) != len(keys):
+            raise ValueError("Expected {} coordinates, got {}.".format(
+                len(keys), len(coordinates)))
+        space = get_space(name)
+        if not space:
+            raise ValueError("No space map named '{}'.".format(name))
+        for coords in coordinates:
+            if not space.is_valid_coordinates(coords):
+                raise ValueError("Invalid coordinates {}.".format(coords))
+
+    created = []
+    try:
+        with transaction.atomic():
+            ships = [_build_ship(key, created) for key in keys]
+            if space:
+                space.move_objs([(ship[0], coords)
+                                 for ship, coords in zip(ships, coordinates)])
+    except Exception:
+        # The database was rolled back: so must be what is kept in memory
+        if space:
+            space.reset_caches()
+        for obj in created:
+            obj.flush_from_cache(force=True)
+        raise
+    return ships
@@ -64,6 +64,9 @@ Customisation example:
     from world import space
 
     class PyramidMapProvider(space.SpaceMapProvider):
+        # The map never changes, so the space map can cache the answers of
+        # is_valid_coordinates
+        pure_coordinates = True
 
         def is_valid_coordinates(self, space, coordinates):
             "Validates if these coordinates are inside the map"
@@ -117,6 +120,12 @@ Implementation details:
     separate rooms.
     Rooms are created as needed. Unneeded rooms are stored away to avoid the
     overhead cost of creating new rooms again in the future.
+    A maintenance script (`<name>_maintenance`) keeps a number of spare rooms
+    ready in that storage, so that moving around rarely has to create a room.
+    The number of spare rooms can be changed per map with the
+    `room_pool_size` Attribute of the space script. When the storage grows
+    over `room_pool_high` rooms, the rooms idle for more than `room_pool_ttl`
+    seconds are deleted until it is back to `room_pool_low` rooms.
 
 Modifications by QBFreak
 
@@ -135,12 +144,96 @@ Modifications by QBFreak
 
 from evennia import DefaultRoom, DefaultExit, DefaultScript
 from evennia import create_object, create_script
+from evennia.objects.models import ObjectDB
+from evennia.typeclasses.attributes import Attribute
 from evennia.utils import inherits_from
+import time
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models.signals import pre_delete
 from typeclasses.objects import Object
 from typeclasses.exits import Exit
+from typeclasses.scripts import Script
+from world.cache import LRUCache
+from world.sectors import SectorGenerator, default_bodies
+from world.spaceindex import SPACE_INDEXES, box_around, distance_squared
+
+
+# The exits every SpaceRoom has, as (key, alias)
+EXITS = [("north", "n"),
+         ("northeast", "ne"),
+         ("east", "e"),
+         ("southeast", "se"),
+         ("south", "s"),
+         ("southwest", "sw"),
+         ("west", "w"),
+         ("northwest", "nw"),
+         ("up", "u"),
+         ("down", "d")]
+
+# Number of spare rooms kept pre-built for each space map
+ROOM_POOL_SIZE = 10
+# Maximum number of rooms built by one maintenance tick
+ROOM_POOL_BATCH = 5
+# When the pool grows over the high watermark, idle rooms are deleted until
+# the pool is back to the low watermark
+ROOM_POOL_HIGH = 50
+ROOM_POOL_LOW = 20
+# Seconds a room must have been idle in the pool before it can be deleted
+ROOM_POOL_TTL = 600
+# Maximum number of rooms deleted by one maintenance tick
+ROOM_POOL_TRIM_BATCH = 20
+# Number of coordinates whose validity is cached for each space map
+VALIDITY_CACHE_SIZE = 4096
+# Seconds between two maintenance ticks
+MAINTENANCE_INTERVAL = 30
+# Number of items checked by the sweep on every maintenance tick
+SWEEP_BATCH = 50
+# Tag category holding the name of the space map a room belongs to
+SPACE_TAG_CATEGORY = "space_map"
+
+# The space maps, key: name, value: SpaceScript. Filled by load_spaces, kept
+# up to date by the space maps as they start and stop.
+_spaces = {}
+_spaces_loaded = False
+
+
+def load_spaces():
+    """
+    Registers every space map of the database, replacing whatever was
+    registered. Called when the server starts (see
+    `server/conf/at_server_startstop.py`), and on the first use of
+    `get_space` otherwise.
+    """
+    global _spaces_loaded
+    _spaces.clear()
+    for script in SpaceScript.objects.all():
+        _spaces[script.key] = script
+    _spaces_loaded = True
+
+
+def get_space(name="space"):
+    """
+    Returns a space map. This is a dictionary lookup, no database query is
+    made once the space maps are registered.
+
+    Args:
+        name (str, optional): the name of the space map
+
+    Returns:
+        SpaceScript: the space map, or None if there is no such map
+    """
+    if not _spaces_loaded:
+        load_spaces()
+    script = _spaces.get(name)
+    if script is not None and not script.pk:
+        # Deleted without being stopped
+        del _spaces[name]
+        return None
+    return script
 
 
-def create_space(name="space", mapprovider=None):
+def create_space(name="space", mapprovider=None, index="grid"):
     """
     Creates a new space map. Does nothing if a space map already exists with
     the same name.
@@ -151,9 +244,14 @@ def create_space(name="space", mapprovider=None):
             subclass) that will be used to provide the layout of this space
             map. If none is provided, the default infinite grid map will be
             used.
+        index (str, optional): the spatial index keeping the items of the
+            space map for range queries: "grid", or "octree" for very large
+            and sparse maps (see `world/spaceindex.py`)
 
     """
-    if SpaceScript.objects.filter(db_key=name).exists():
+    if index not in SPACE_INDEXES:
+        raise ValueError("Unknown spatial index '{}'.".format(index))
+    if get_space(name):
         # Don't create two spaces with the same name
         return
 
@@ -161,6 +259,9 @@ def create_space(name="space", mapprovider=None):
         mapprovider = SpaceMapProvider()
     script = create_script(SpaceScript, key=name)
     script.db.mapprovider = mapprovider
+    script.db.index = index
+    # The store was built when the script started, before the index was set
+    script.ndb.itemcoordinates = None
 
 
 def enter_space(obj, coordinates=(0, 0, 0), name="space"):
@@ -178,10 +279,10 @@ def enter_space(obj, coordinates=(0, 0, 0), name="space"):
     Returns:
         bool: True if obj successfully moved into the space.
     """
-    if not SpaceScript.objects.filter(db_key=name).exists():
+    script = get_space(name)
+    if not script:
         return False
 
-    script = SpaceScript.objects.get(db_key=name)
     if script.is_valid_coordinates(coordinates):
         script.move_obj(obj, coordinates)
         return True
@@ -218,6 +319,309 @@ def get_new_coordinates(coordinates, direction):
     return (x, y, z)
 
 
+class SpacePositionStore(object):
+    """
+    Stores the coordinates of every item inside a space map.
+
+    The store behaves like a dictionary (key: object, value: (x, y, z)) so it
+    can be used in place of the `itemcoordinates` Attribute the space map used
+    to keep. Instead of re-pickling one big dictionary on every move, each
+    item keeps its own coordinates in an Attribute on the item itself: moving
+    an item only writes the row of that item.
+
+    A reverse index (coordinates to the set of items found there) is kept in
+    memory next to the coordinates, so lookups by coordinates only cost the
+    number of items located there. A spatial index (see
+    `world/spaceindex.py`) answers the range queries.
+
+    Inside a `with store.batch():` block the writes are held back, and the
+    rows of every item that moved are written once, in a single transaction,
+    when the block ends.
+    """
+    attribute_key = "coordinates"
+
+    def __init__(self, name, index="grid"):
+        """
+        Args:
+            name (str): name of the space map the store belongs to
+            index (str, optional): name of the spatial index to use, one of
+                `SPACE_INDEXES`
+        """
+        self.category = "space:{}".format(name)
+        self._coordinates = {}
+        self._index = {}
+        self._spatial = SPACE_INDEXES[index]()
+        # Writes held back by batch(), key: item, value: coordinates or None
+        # if the item left
+        self._pending = {}
+        self._batch_depth = 0
+
+    def load(self):
+        """
+        Loads the coordinates of every item of this space map from the
+        database. This replaces whatever the store held in memory.
+
+        The coordinates are read in one query and the items in another,
+        whatever the number of items.
+        """
+        self._coordinates = {}
+        self._index = {}
+        self._spatial.clear()
+        attributes = Attribute.objects.filter(db_key=self.attribute_key,
+                                              db_category=self.category)
+        positions = dict(attributes.values_list("objectdb__id", "db_value"))
+        for obj in ObjectDB.objects.filter(db_attributes__in=attributes):
+            coordinates = positions.get(obj.id)
+            if coordinates is None:
+                continue
+            self._set(obj, tuple(coordinates))
+
+    def _set(self, obj, coordinates):
+        """
+        Updates the in-memory coordinates and reverse index of obj.
+        """
+        old_coordinates = self._coordinates.get(obj)
+        if old_coordinates is not None:
+            self._unindex(obj, old_coordinates)
+        self._coordinates[obj] = coordinates
+        self._index.setdefault(coordinates, set()).add(obj)
+        self._spatial.add(obj, coordinates)
+
+    def _unindex(self, obj, coordinates):
+        """
+        Removes obj from the reverse index at coordinates.
+        """
+        self._spatial.remove(obj, coordinates)
+        items = self._index.get(coordinates)
+        if items is None:
+            return
+        items.discard(obj)
+        if not items:
+            del self._index[coordinates]
+
+    def objs_at(self, coordinates):
+        """
+        Returns the items located at coordinates.
+
+        Args:
+            coordinates (tuple): coordinates as (x, y, z) tuple
+
+        Returns:
+            [Object, ]: list of items at those coordinates
+        """
+        return list(self._index.get(coordinates, ()))
+
+    def count_at(self, coordinates):
+        """
+        Returns the number of items located at coordinates.
+
+        Args:
+            coordinates (tuple): coordinates as (x, y, z) tuple
+
+        Returns:
+            int: the number of items at those coordinates
+        """
+        return len(self._index.get(coordinates, ()))
+
+    def objs_in_box(self, bounds):
+        """
+        Returns the items located inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`
+        """
+        return self._spatial.in_box(bounds)
+
+    def objs_in_radius(self, coordinates, radius):
+        """
+        Returns the items located within a distance of coordinates.
+
+        Args:
+            coordinates (tuple): the (x, y, z) coordinates to measure from
+            radius (int): the greatest distance, included
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`
+        """
+        return self._spatial.in_radius(coordinates, radius)
+
+    def nearest(self, coordinates, count=1):
+        """
+        Returns the items nearest to coordinates.
+
+        Args:
+            coordinates (tuple): the (x, y, z) coordinates to measure from
+            count (int, optional): the number of items to return
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`, nearest first
+        """
+        return self._spatial.nearest(coordinates, count)
+
+    def occupied(self, bounds):
+        """
+        Returns the coordinates holding at least one item inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            set: the occupied (x, y, z) coordinates
+        """
+        return self._spatial.occupied(bounds)
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager holding back the database writes until the end of
+        the block. Batches can be nested, the writes happen when the
+        outermost one ends. If the outermost block raises, the held back
+        writes are dropped: the transaction around it is rolling back, and
+        the store is left to be loaded again.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._pending = {}
+            raise
+        else:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the held back positions to the database, in one transaction.
+        """
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with transaction.atomic():
+            for obj, coordinates in pending.items():
+                self._write(obj, coordinates)
+
+    def _write(self, obj, coordinates):
+        """
+        Writes the position of obj to the database, removes it if coordinates
+        is None.
+        """
+        if coordinates is not None:
+            obj.attributes.add(self.attribute_key, coordinates,
+                               category=self.category)
+        elif obj.pk:
+            obj.attributes.remove(self.attribute_key, category=self.category)
+
+    def _save(self, obj, coordinates):
+        """
+        Writes the position of obj now, or at the end of the batch.
+        """
+        if self._batch_depth:
+            self._pending[obj] = coordinates
+        else:
+            self._write(obj, coordinates)
+
+    def __getitem__(self, obj):
+        return self._coordinates[obj]
+
+    def __setitem__(self, obj, coordinates):
+        coordinates = tuple(coordinates)
+        if self._coordinates.get(obj) == coordinates:
+            return
+        self._set(obj, coordinates)
+        self._save(obj, coordinates)
+
+    def discard(self, obj):
+        """
+        Forgets obj without writing anything, for items whose Attributes are
+        gone already (like deleted objects).
+
+        Args:
+            obj (Object): the item to forget
+
+        Returns:
+            tuple: the (x, y, z) coordinates obj was at, None if it was not
+                in the store
+        """
+        if not obj.pk:
+            # Deleted objects can't be hashed anymore
+            for item, coordinates in self.purge_deleted():
+                if item is obj:
+                    return coordinates
+            return None
+        coordinates = self._coordinates.pop(obj, None)
+        self._pending.pop(obj, None)
+        if coordinates is not None:
+            self._unindex(obj, coordinates)
+        return coordinates
+
+    def purge_deleted(self):
+        """
+        Forgets every deleted item at once. Deleted objects can't be hashed
+        anymore, so they are found by identity in a single pass over the
+        store, whatever their number.
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`, the items forgotten and the
+                coordinates they were at
+        """
+        deleted = [(item, coordinates) for item, coordinates
+                   in self._coordinates.items() if not item.pk]
+        if not deleted:
+            return deleted
+        self._coordinates = dict(
+            (item, coordinates) for item, coordinates
+            in self._coordinates.items() if item.pk)
+        self._pending = dict(
+            (item, coordinates) for item, coordinates
+            in self._pending.items() if item.pk)
+        for coordinates in set(coords for item, coords in deleted):
+            items = set(item for item in self._index.get(coordinates, ())
+                        if item.pk)
+            if items:
+                self._index[coordinates] = items
+            else:
+                self._index.pop(coordinates, None)
+        # The spatial index can't find deleted items either: fill it again
+        self._spatial.clear()
+        for item, coordinates in self._coordinates.items():
+            self._spatial.add(item, coordinates)
+        return deleted
+
+    def __delitem__(self, obj):
+        coordinates = self._coordinates.pop(obj)
+        self._unindex(obj, coordinates)
+        self._save(obj, None)
+
+    def __contains__(self, obj):
+        return obj in self._coordinates
+
+    def __iter__(self):
+        return iter(list(self._coordinates))
+
+    def __len__(self):
+        return len(self._coordinates)
+
+    def get(self, obj, default=None):
+        return self._coordinates.get(obj, default)
+
+    def keys(self):
+        return list(self._coordinates.keys())
+
+    def values(self):
+        return list(self._coordinates.values())
+
+    def items(self):
+        return list(self._coordinates.items())
+
+
 class SpaceScript(DefaultScript):
     """
     This is the main "handler" for the space system: inside here the
@@ -233,10 +637,6 @@ class SpaceScript(DefaultScript):
         """
         self.persistent = True
 
-        # Store the coordinates of every item that is inside space
-        # Key: object, Value: (x, y, z)
-        self.db.itemcoordinates = {}
-
         # Store the rooms that are used as views into space
         # Key: (x, y, z), Value: room object
         self.db.rooms = {}
@@ -246,6 +646,13 @@ class SpaceScript(DefaultScript):
         # create it.
         self.db.unused_rooms = []
 
+        # Number of spare rooms the maintenance script keeps in unused_rooms
+        self.db.room_pool_size = ROOM_POOL_SIZE
+        # Watermarks and idle time used to shrink unused_rooms again
+        self.db.room_pool_high = ROOM_POOL_HIGH
+        self.db.room_pool_low = ROOM_POOL_LOW
+        self.db.room_pool_ttl = ROOM_POOL_TTL
+
     @property
     def mapprovider(self):
         """
@@ -256,6 +663,23 @@ class SpaceScript(DefaultScript):
         """
         return self.db.mapprovider
 
+    @property
+    def open_space(self):
+        """
+        True if every coordinates of this space map are valid, that is if the
+        map provider keeps the default `is_valid_coordinates`. Nothing can
+        block a course through open space.
+
+        Returns:
+            bool: True if no coordinates are ever invalid
+        """
+        method = getattr(type(self.mapprovider), "is_valid_coordinates", None)
+        default = SpaceMapProvider.is_valid_coordinates
+        # Unbound methods are built anew on every access: compare the
+        # functions behind them
+        return getattr(method, "__func__", method) is \
+            getattr(default, "__func__", default)
+
     @property
     def itemcoordinates(self):
         """
@@ -263,38 +687,304 @@ class SpaceScript(DefaultScript):
         space map. The key is the item, the value are the coordinates as
         (x, y, z) tuple.
 
+        Implementation detail: this is a `SpacePositionStore`, which only
+        writes the position of the items that actually moved.
+
         Returns:
             {item: coordinates}
         """
-        return self.db.itemcoordinates
+        if self.ndb.itemcoordinates is None:
+            store = SpacePositionStore(self.key,
+                                       index=self.db.index or "grid")
+            store.load()
+            self.ndb.itemcoordinates = store
+        return self.ndb.itemcoordinates
 
     def at_start(self):
         """
         Called when the script is started and also after server reloads.
+
+        Nothing is loaded here: the rooms find their space map and their
+        coordinates when they first need them (see `SpaceRoom.space`), and
+        the positions of the items are loaded on first use.
+        """
+        _spaces[self.key] = self
+        self.ndb.itemcoordinates = None
+        self.ndb.room_coordinates = None
+        if self.attributes.has("itemcoordinates"):
+            self._migrate_itemcoordinates()
+        if not self.db.rooms_tagged:
+            self._tag_rooms()
+        self._start_maintenance()
+
+    def at_stop(self):
+        """
+        Called when the script is stopped, which includes being deleted.
+        """
+        self._shut_down()
+
+    def delete(self):
+        """
+        Deletes the space map along with its maintenance script.
+        """
+        self._shut_down()
+        return super(SpaceScript, self).delete()
+
+    def _shut_down(self):
+        """
+        Unregisters the space map and deletes its maintenance script. Safe to
+        call more than once.
+        """
+        if _spaces.get(self.key) is self:
+            del _spaces[self.key]
+        key = "{}_maintenance".format(self.key)
+        for script in SpaceMaintenanceScript.objects.filter(db_key=key):
+            if script.db.space in (None, self):
+                script.delete()
+
+    def _tag_rooms(self):
+        """
+        Tags the rooms created before rooms were tagged with the name of their
+        space map. This only runs once.
+        """
+        for room in list(self.db.rooms.values()) + list(self.db.unused_rooms):
+            if room:
+                room.tags.add(self.key, category=SPACE_TAG_CATEGORY)
+                room.ndb.spacescript = self
+        self.db.rooms_tagged = True
+
+    def get_room_coordinates(self, room):
+        """
+        Returns the coordinates a room shows. The rooms in use are indexed
+        the first time this is needed after a reload.
+
+        Args:
+            room (SpaceRoom): a room of this space map
+
+        Returns:
+            tuple: the (x, y, z) coordinates of the room, or None if the room
+                is not in use
+        """
+        if self.ndb.room_coordinates is None:
+            self.ndb.room_coordinates = dict(
+                (used, coordinates)
+                for coordinates, used in self.db.rooms.items())
+        return self.ndb.room_coordinates.get(room)
+
+    def _track_room(self, room, coordinates):
+        """
+        Keeps the index of `get_room_coordinates` up to date when a room
+        shows new coordinates, or is put away when coordinates is None.
+        """
+        index = self.ndb.room_coordinates
+        if index is None:
+            # Not built yet, it will be built from the rooms in use
+            return
+        if coordinates is None:
+            index.pop(room, None)
+        else:
+            index[room] = coordinates
+
+    def _start_maintenance(self):
+        """
+        Makes sure the maintenance script of this space map exists and works
+        for this space map. A script left behind by a deleted map of the same
+        name is taken over.
+        """
+        key = "{}_maintenance".format(self.key)
+        script = SpaceMaintenanceScript.objects.filter(db_key=key).first()
+        if not script:
+            script = create_script(SpaceMaintenanceScript, key=key)
+        if script.db.space != self:
+            script.db.space = self
+
+    def at_maintenance(self):
+        """
+        Called by the maintenance script of this space map on every tick.
+        """
+        self.refill_room_pool()
+        self.trim_room_pool()
+        self.sweep()
+
+    def at_object_delete_in_space(self, obj):
+        """
+        Called when an object of this space map (an item or a room) is about
+        to be deleted.
+
+        Args:
+            obj (Object): the object being deleted
+        """
+        if self.ndb.itemcoordinates is not None:
+            coordinates = self.ndb.itemcoordinates.discard(obj)
+            if coordinates is not None:
+                # Put the room away if obj was its last occupant
+                self._destroy_room(self.db.rooms.get(coordinates))
+        if isinstance(obj, SpaceRoom):
+            coordinates = obj.coordinates
+            if coordinates is not None and \
+               self.db.rooms.get(coordinates) == obj:
+                del self.db.rooms[coordinates]
+            self._track_room(obj, None)
+            if obj in self.db.unused_rooms:
+                self.db.unused_rooms.remove(obj)
+
+    def sweep(self, batch_size=SWEEP_BATCH):
         """
-        for coordinates, room in self.db.rooms.items():
-            room.ndb.spacescript = self
-            room.ndb.active_coordinates = coordinates
-        for item in self.db.itemcoordinates.keys():
+        Checks some of the items of this space map, and forgets the ones that
+        are not in space anymore: deleted, or moved out of space without
+        going through the space map. Every call checks the next batch_size
+        items, so the whole map is checked over several calls. The rooms
+        left empty are put away.
+
+        Args:
+            batch_size (int, optional): the number of items to check
+
+        Returns:
+            int: the number of items forgotten
+        """
+        queue = self.ndb.sweep_queue
+        if not queue:
+            queue = self.ndb.sweep_queue = list(self.itemcoordinates)
+        itemcoordinates = self.itemcoordinates
+        swept = 0
+        deleted = False
+        # Coordinates of the items forgotten, whose rooms may be empty now
+        left = []
+        for _ in range(min(batch_size, len(queue))):
+            obj = queue.pop()
+            if not obj.pk:
+                # Forgotten together at the end of the batch
+                deleted = True
+                continue
+            if obj not in itemcoordinates:
+                # Left space since the queue was filled
+                continue
+            location = obj.location
+            if location is None or (isinstance(location, SpaceRoom) and
+                                    location.space == self):
+                # Still in space. Objects of disconnected players have no
+                # location, they go back to their room when they come back.
+                continue
+            left.append(itemcoordinates[obj])
+            del itemcoordinates[obj]
+            swept += 1
+        if deleted:
+            for obj, coordinates in itemcoordinates.purge_deleted():
+                left.append(coordinates)
+                swept += 1
+        for coordinates in left:
+            self._destroy_room(self.db.rooms.get(coordinates))
+        self.ndb.swept = (self.ndb.swept or 0) + swept
+        return swept
+
+    def _migrate_itemcoordinates(self):
+        """
+        Moves the coordinates kept in the old `itemcoordinates` Attribute to
+        the position store, then removes that Attribute.
+        """
+        itemcoordinates = self.itemcoordinates
+        for item, coordinates in self.db.itemcoordinates.items():
             # Items deleted from space leave None type 'ghosts'
             # that must be cleaned out
             if item is None:
-                del self.db.itemcoordinates[item]
                 continue
-            item.ndb.space = self
+            itemcoordinates[item] = coordinates
+        self.attributes.remove("itemcoordinates")
 
     def is_valid_coordinates(self, coordinates):
         """
         Returns True if coordinates are valid (and can be travelled to).
         Otherwise returns False
 
+        If the map provider declares its results as pure (see
+        `SpaceMapProvider.pure_coordinates`) the answer is cached.
+
         Args:
             coordinates (tuple): coordinates as (x, y, z) tuple
 
         Returns:
             bool: True if the coordinates are valid
         """
-        return self.mapprovider.is_valid_coordinates(self, coordinates)
+        mapprovider = self.mapprovider
+        if not mapprovider.pure_coordinates:
+            return mapprovider.is_valid_coordinates(self, coordinates)
+        cache = self.validity_cache
+        valid = cache.get(coordinates)
+        if valid is None:
+            valid = bool(mapprovider.is_valid_coordinates(self, coordinates))
+            cache.set(coordinates, valid)
+        return valid
+
+    @property
+    def validity_cache(self):
+        """
+        Returns the cache of coordinates validity of this space map. It is not
+        persistent and starts empty after a reload.
+
+        Returns:
+            LRUCache: the cache, key: (x, y, z), value: bool
+        """
+        if self.ndb.validity_cache is None:
+            self.ndb.validity_cache = LRUCache(maxsize=VALIDITY_CACHE_SIZE)
+        return self.ndb.validity_cache
+
+    def invalidate_coordinates(self, coordinates=None):
+        """
+        Tells the space map that the validity of some coordinates changed.
+        Map providers whose map changes while the game runs need to call this,
+        so that the cached answers and the exits of the rooms nearby are
+        updated.
+
+        Args:
+            coordinates (tuple, optional): the (x, y, z) coordinates that
+                changed. If not given, the whole map is invalidated.
+        """
+        if coordinates is None:
+            self.validity_cache.invalidate()
+            rooms = list(self.db.rooms.values())
+        else:
+            self.validity_cache.invalidate(coordinates)
+            # Only the rooms next to those coordinates have exits leading there
+            rooms = []
+            for key, alias in EXITS:
+                room = self.db.rooms.get(get_new_coordinates(coordinates, key))
+                if room:
+                    rooms.append(room)
+        for room in rooms:
+            room.refresh_exits()
+
+    def reset_caches(self):
+        """
+        Forgets the positions, rooms and Attributes of this space map kept in
+        memory, so that they are loaded again from the database. Call this
+        after rolling back a transaction that moved objects in the map.
+        """
+        self.ndb.itemcoordinates = None
+        self.ndb.room_coordinates = None
+        self.attributes.reset_cache()
+
+    def validity_cache_stats(self):
+        """
+        Returns statistics about the coordinates validity cache.
+
+        Returns:
+            dict: see `LRUCache.stats`
+        """
+        return self.validity_cache.stats()
+
+    @property
+    def sectors(self):
+        """
+        Returns the generator of the sectors of this space map, holding the
+        celestial bodies provided by the map provider.
+
+        Returns:
+            SectorGenerator: the sector generator
+        """
+        if self.ndb.sectors is None:
+            self.ndb.sectors = SectorGenerator(
+                bodies=self.mapprovider.get_celestial_bodies())
+        return self.ndb.sectors
 
     def get_obj_coordinates(self, obj):
         """
@@ -314,9 +1004,8 @@ class SpaceScript(DefaultScript):
         """
         Returns a list of every object at certain coordinates.
 
-        Imeplementation detail: this uses a naive iteration through every
-        object inside space which could cause slow downs when there are a lot
-        of objects in the map.
+        Implementation detail: this uses the reverse coordinate index, so the
+        cost only depends on the number of objects at those coordinates.
 
         Args:
             coordinates (tuple): a coordinate tuple like (x, y, z)
@@ -324,16 +1013,84 @@ class SpaceScript(DefaultScript):
         Returns:
             [Object, ]: list of Objects at coordinates
         """
-        result = []
-        for item, item_coordinates in self.itemcoordinates.items():
-            # Items deleted from space leave None type 'ghosts'
-            # that must be cleaned out
-            if item is None:
-                del self.db.itemcoordinates[item]
-                continue
-            if coordinates == item_coordinates:
-                result.append(item)
-        return result
+        return self.itemcoordinates.objs_at(coordinates)
+
+    def get_objs_in_box(self, bounds):
+        """
+        Returns all items located inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`, in no particular order
+        """
+        return self.itemcoordinates.objs_in_box(bounds)
+
+    def get_objs_in_radius(self, coordinates, radius):
+        """
+        Returns all items located within a distance of coordinates, nearest
+        first.
+
+        Args:
+            coordinates (tuple): the (x, y, z) coordinates to measure from
+            radius (int): the greatest distance, included
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`
+        """
+        found = self.itemcoordinates.objs_in_radius(coordinates, radius)
+        found.sort(key=lambda item: distance_squared(coordinates, item[1]))
+        return found
+
+    def get_nearest_objs(self, coordinates, count=1):
+        """
+        Returns the items nearest to coordinates, whatever their distance.
+
+        Args:
+            coordinates (tuple): the (x, y, z) coordinates to measure from
+            count (int, optional): the number of items to return
+
+        Returns:
+            list: `[(Object, (x, y, z)), ...]`, nearest first
+        """
+        return self.itemcoordinates.nearest(coordinates, count)
+
+    def get_occupied_coordinates(self, bounds):
+        """
+        Returns the coordinates holding at least one item inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            set: the occupied (x, y, z) coordinates
+        """
+        return self.itemcoordinates.occupied(bounds)
+
+    def get_bodies_in_radius(self, coordinates, radius, ready_only=False):
+        """
+        Returns the celestial bodies present within a distance of
+        coordinates, nearest first. They are read from the generated sectors.
+
+        Args:
+            coordinates (tuple): the (x, y, z) coordinates to measure from
+            radius (int): the greatest distance, included
+            ready_only (bool, optional): if True, only the sectors already
+                generated are read, see `SectorGenerator.bodies_in_box`
+
+        Returns:
+            list: `[(SpaceObject, (x, y, z)), ...]`
+        """
+        limit = radius * radius
+        bodies = self.sectors.bodies_in_box(box_around(coordinates, radius),
+                                            ready_only=ready_only)
+        found = [(body, coords) for body, coords in bodies
+                 if distance_squared(coordinates, coords) <= limit]
+        found.sort(key=lambda item: distance_squared(coordinates, item[1]))
+        return found
 
     def move_obj(self, obj, new_coordinates):
         """
@@ -372,14 +1129,10 @@ class SpaceScript(DefaultScript):
                     # space map
                     create_new_room = True
                     old_room.space.at_after_object_leave(obj)
-                else:
-                    for item in old_room.contents:
-                        if not isinstance(item, SpaceExit):
-                            # There is still an object in the old room.
-                            # Let's create a new room and not touch that old
-                            # room.
-                            create_new_room = True
-                            break
+                elif old_room.occupant_count:
+                    # There is still an object in the old room. Let's create
+                    # a new room and not touch that old room.
+                    create_new_room = True
 
                 if create_new_room:
                     # Create a new room to hold obj, not touching any obj's in
@@ -394,6 +1147,69 @@ class SpaceScript(DefaultScript):
         obj.location = room
         obj.ndb.space = self
 
+        # Let the object react to the move, ships use this to prepare the
+        # sectors ahead of them
+        at_space_move = getattr(obj, "at_space_move", None)
+        if at_space_move:
+            at_space_move(self, new_coordinates)
+
+    def move_objs(self, moves):
+        """
+        Moves several objects at once, like the ships of a fleet. The moves
+        are grouped by destination: each destination room is prepared once,
+        and the positions of all the objects are saved together.
+
+        Args:
+            moves (list): `[(obj, (x, y, z)), ...]`, the objects to move and
+                where to move them
+        """
+        itemcoordinates = self.itemcoordinates
+        destinations = []
+        by_destination = {}
+        old_rooms = []
+        with transaction.atomic(), itemcoordinates.batch():
+            # Update every position first, so the rooms left behind are seen
+            # as empty
+            for obj, new_coordinates in moves:
+                new_coordinates = tuple(new_coordinates)
+                old_room = obj.location
+                if inherits_from(old_room, SpaceRoom):
+                    if old_room.space != self:
+                        old_room.space.at_after_object_leave(obj)
+                    elif old_room not in old_rooms:
+                        old_rooms.append(old_room)
+                itemcoordinates[obj] = new_coordinates
+                obj.location = None
+                if new_coordinates not in by_destination:
+                    destinations.append(new_coordinates)
+                    by_destination[new_coordinates] = []
+                by_destination[new_coordinates].append(obj)
+
+            for new_coordinates in destinations:
+                objs = by_destination[new_coordinates]
+                room = self.db.rooms.get(new_coordinates)
+                if room is None:
+                    # Reuse a room left empty, or get a new one
+                    for old_room in old_rooms:
+                        if not old_room.occupant_count:
+                            old_rooms.remove(old_room)
+                            room = old_room
+                            break
+                    else:
+                        room = self._create_room(new_coordinates, objs[0])
+                room.set_active_coordinates(new_coordinates, objs[0])
+                for obj in objs:
+                    obj.location = room
+                    obj.ndb.space = self
+
+            for old_room in old_rooms:
+                self._destroy_room(old_room)
+
+        for obj, new_coordinates in moves:
+            at_space_move = getattr(obj, "at_space_move", None)
+            if at_space_move:
+                at_space_move(self, tuple(new_coordinates))
+
     def _create_room(self, coordinates, report_to):
         """
         Gets a new SpaceRoom to be used for the provided coordinates.
@@ -409,32 +1225,12 @@ class SpaceScript(DefaultScript):
             # There is still unused rooms stored in storage, let's get one of
             # those
             room = self.db.unused_rooms.pop()
+            self._pool_idle_since().pop(room.id, None)
+            self.ndb.pool_hits = (self.ndb.pool_hits or 0) + 1
         else:
             # No more unused rooms...time to make a new one.
-
-            # First, create the room
-            room = create_object(typeclass=self.mapprovider.room_typeclass,
-                                 key="Space",
-                                 report_to=report_to)
-
-            # Then the exits
-            exits = [("north", "n"),
-                     ("northeast", "ne"),
-                     ("east", "e"),
-                     ("southeast", "se"),
-                     ("south", "s"),
-                     ("southwest", "sw"),
-                     ("west", "w"),
-                     ("northwest", "nw"),
-                     ("up", "u"),
-                     ("down", "d")]
-            for key, alias in exits:
-                create_object(typeclass=self.mapprovider.exit_typeclass,
-                              key=key,
-                              aliases=[alias],
-                              location=room,
-                              destination=room,
-                              report_to=report_to)
+            room = self._build_room(report_to)
+            self.ndb.pool_misses = (self.ndb.pool_misses or 0) + 1
 
         room.ndb.active_coordinates = coordinates
         room.ndb.spacescript = self
@@ -442,6 +1238,164 @@ class SpaceScript(DefaultScript):
 
         return room
 
+    def _build_room(self, report_to=None):
+        """
+        Creates a new SpaceRoom along with its exits.
+
+        Args:
+            report_to (object, optional): the obj to return error messages to
+
+        Returns:
+            SpaceRoom: the new room
+        """
+        # First, create the room
+        room = create_object(typeclass=self.mapprovider.room_typeclass,
+                             key="Space",
+                             tags=[(self.key, SPACE_TAG_CATEGORY)],
+                             report_to=report_to)
+
+        if self.mapprovider.virtual_exits:
+            # Movement is handled by the room's cmdset, no exits needed
+            room.cmdset.add("spaceexits.SpaceExitCmdSet", permanent=True)
+            return room
+
+        # Then the exits
+        for key, alias in EXITS:
+            create_object(typeclass=self.mapprovider.exit_typeclass,
+                          key=key,
+                          aliases=[alias],
+                          location=room,
+                          destination=room,
+                          report_to=report_to)
+        return room
+
+    @property
+    def room_pool_size(self):
+        """
+        Number of spare rooms the maintenance script keeps ready.
+
+        Returns:
+            int: the target size of the room pool
+        """
+        return self.attributes.get("room_pool_size", default=ROOM_POOL_SIZE)
+
+    def refill_room_pool(self, batch_size=ROOM_POOL_BATCH):
+        """
+        Builds spare rooms until the pool reaches `room_pool_size`. All the
+        rooms of one call are created inside a single database transaction.
+
+        Args:
+            batch_size (int, optional): the maximum number of rooms to build
+
+        Returns:
+            int: the number of rooms that were built
+        """
+        missing = min(self.room_pool_size - len(self.db.unused_rooms),
+                      batch_size)
+        if missing <= 0:
+            return 0
+        with transaction.atomic():
+            rooms = [self._build_room() for _ in range(missing)]
+        # Save the pool once instead of once per room
+        self.db.unused_rooms = list(self.db.unused_rooms) + rooms
+        idle_since = self._pool_idle_since()
+        now = time.time()
+        for room in rooms:
+            idle_since[room.id] = now
+        return len(rooms)
+
+    def _pool_idle_since(self):
+        """
+        Returns when each room of the pool was put away. This is not
+        persistent: after a reload rooms count as idle since the reload.
+
+        Returns:
+            {room id: timestamp}
+        """
+        if self.ndb.pool_idle_since is None:
+            self.ndb.pool_idle_since = {}
+        return self.ndb.pool_idle_since
+
+    def trim_room_pool(self, batch_size=ROOM_POOL_TRIM_BATCH):
+        """
+        Deletes idle rooms when the pool has grown over its high watermark,
+        until it is back to its low watermark. Only rooms that have been idle
+        for longer than `room_pool_ttl` seconds are deleted, the ones idle for
+        the longest first.
+
+        Args:
+            batch_size (int, optional): the maximum number of rooms to delete
+
+        Returns:
+            int: the number of rooms that were deleted
+        """
+        unused_rooms = list(self.db.unused_rooms)
+        high = self.attributes.get("room_pool_high", default=ROOM_POOL_HIGH)
+        if len(unused_rooms) <= high:
+            return 0
+        low = self.attributes.get("room_pool_low", default=ROOM_POOL_LOW)
+        low = max(low, self.room_pool_size)
+        ttl = self.attributes.get("room_pool_ttl", default=ROOM_POOL_TTL)
+
+        idle_since = self._pool_idle_since()
+        now = time.time()
+        for room in unused_rooms:
+            idle_since.setdefault(room.id, now)
+
+        # Rooms are taken from the end of the pool, so the front holds the
+        # ones idle for the longest
+        expired = []
+        for room in unused_rooms[:len(unused_rooms) - low]:
+            if len(expired) >= batch_size:
+                break
+            if now - idle_since[room.id] >= ttl:
+                expired.append(room)
+        if not expired:
+            return 0
+
+        # Take the rooms out of the pool first: deleted rooms can't be
+        # compared anymore
+        expired_ids = set(room.id for room in expired)
+        self.db.unused_rooms = [room for room in unused_rooms
+                                if room.id not in expired_ids]
+        with transaction.atomic():
+            for room in expired:
+                idle_since.pop(room.id, None)
+                # Deleting the room also deletes its exits
+                room.delete()
+        self.ndb.pool_trimmed = (self.ndb.pool_trimmed or 0) + len(expired)
+        return len(expired)
+
+    def room_pool_stats(self):
+        """
+        Returns statistics about the room pool. Hits, misses and trimmed
+        rooms are counted since the last server reload.
+
+        Returns:
+            dict: with the keys `size` (number of spare rooms), `objects`
+                (number of database objects held by the pool, rooms and
+                exits), `target`, `high`, `low`, `ttl`, `oldest_idle`
+                (seconds), `hits`, `misses` and `trimmed`
+        """
+        size = len(self.db.unused_rooms)
+        exits = 0 if self.mapprovider.virtual_exits else len(EXITS)
+        idle_since = self._pool_idle_since()
+        now = time.time()
+        oldest = min(idle_since.values()) if idle_since else now
+        return {"size": size,
+                "objects": size * (1 + exits),
+                "target": self.room_pool_size,
+                "high": self.attributes.get("room_pool_high",
+                                            default=ROOM_POOL_HIGH),
+                "low": self.attributes.get("room_pool_low",
+                                           default=ROOM_POOL_LOW),
+                "ttl": self.attributes.get("room_pool_ttl",
+                                           default=ROOM_POOL_TTL),
+                "oldest_idle": now - oldest,
+                "hits": self.ndb.pool_hits or 0,
+                "misses": self.ndb.pool_misses or 0,
+                "trimmed": self.ndb.pool_trimmed or 0}
+
     def _destroy_room(self, room):
         """
         Moves a room back to storage. If room is not a SpaceRoom or there
@@ -453,25 +1407,49 @@ class SpaceScript(DefaultScript):
         if not room or not inherits_from(room, SpaceRoom):
             return
 
-        for item in room.contents:
-            if not isinstance(item, SpaceExit):
-                # There is still an object in that room.
-                # We can't get rid of it just yet
-                break
-        else:
-            # No characters left in the room.
+        if room.occupant_count:
+            # There is still an object in that room.
+            # We can't get rid of it just yet
+            return
+
+        # No characters left in the room: delete its reference
+        del self.db.rooms[room.coordinates]
+        room.ndb.active_coordinates = None
+        self._track_room(room, None)
+        # And put this room away in storage
+        self.db.unused_rooms.append(room)
+        self._pool_idle_since()[room.id] = time.time()
 
-            # Clear the location of every obj in that room first
-            for item in room.contents:
-                if item.destination and item.destination == room:
-                    # Ignore the exits, they stay in the room
-                    continue
-                item.location = None
+    def traverse_obj(self, traversing_object, new_coordinates):
+        """
+        Moves traversing_object to new coordinates the way a player walking
+        there would: the move hooks are called and the rooms at both ends are
+        told about the departure and the arrival.
+
+        Args:
+            traversing_object (Object): the object doing the travelling
+            new_coordinates (tuple): (x, y, z) coordinates of where
+                `traversing_object` wants to travel to
+
+        Returns:
+            bool: True if traversing_object was moved
+        """
+        current_coordinates = self.itemcoordinates[traversing_object]
+
+        if not traversing_object.at_before_move(None):
+            return False
+        traversing_object.location.msg_contents("{} leaves to {}".format(
+            traversing_object.key, new_coordinates),
+            exclude=[traversing_object])
+
+        self.move_obj(traversing_object, new_coordinates)
+
+        traversing_object.location.msg_contents("{} arrives from {}".format(
+            traversing_object.key, current_coordinates),
+            exclude=[traversing_object])
 
-            # Then delete its reference
-            del self.db.rooms[room.ndb.active_coordinates]
-            # And finally put this room away in storage
-            self.db.unused_rooms.append(room)
+        traversing_object.at_after_move(None)
+        return True
 
     def at_after_object_leave(self, obj):
         """
@@ -481,14 +1459,53 @@ class SpaceScript(DefaultScript):
             obj (object): the object that left
         """
         # Remove that obj from space's coordinates dict
-        loc = self.db.itemcoordinates[obj]
-        del self.db.itemcoordinates[obj]
+        loc = self.itemcoordinates[obj]
+        del self.itemcoordinates[obj]
 
         # And see if we can put that room away into storage.
         room = self.db.rooms[loc]
         self._destroy_room(room)
 
 
+def _at_object_delete(sender, instance, **kwargs):
+    """
+    Called when any object is about to be deleted.
+    """
+    if not isinstance(instance, ObjectDB):
+        return
+    for space in list(_spaces.values()):
+        if space.pk:
+            space.at_object_delete_in_space(instance)
+
+
+# Typeclasses are proxy models sending the signal as themselves: no sender
+# filter
+pre_delete.connect(_at_object_delete, dispatch_uid="space_object_delete")
+
+
+class SpaceMaintenanceScript(Script):
+    """
+    Background script doing the housekeeping of a space map, like keeping
+    spare rooms ready so that moving around rarely has to create any.
+    """
+
+    def at_script_creation(self):
+        """
+        Only called once, when the script is created. This is a default Evennia
+        hook.
+        """
+        self.persistent = True
+        self.interval = MAINTENANCE_INTERVAL
+        self.start_delay = True
+
+    def at_repeat(self):
+        """
+        Called every `interval` seconds.
+        """
+        if self.db.space:
+            self.db.space.at_maintenance()
+
+
 class SpaceRoom(DefaultRoom, Object):
     """
     This is a single room inside space. This room provides a "view"
@@ -507,6 +1524,16 @@ class SpaceRoom(DefaultRoom, Object):
         Returns:
             SpaceScript: the SpaceScript attached to this room
         """
+        if self.ndb.spacescript is None:
+            # First use after a reload. The tag is only read once, rooms
+            # without one remember it as ""
+            name = self.ndb.space_name
+            if name is None:
+                name = self.tags.get(category=SPACE_TAG_CATEGORY) or ""
+                self.ndb.space_name = name
+            if not name:
+                return None
+            self.ndb.spacescript = get_space(name)
         return self.ndb.spacescript
 
     @property
@@ -528,8 +1555,26 @@ class SpaceRoom(DefaultRoom, Object):
         Returns:
             tuple: (x, y, z) coordinates of where this room is inside space
         """
+        if self.ndb.active_coordinates is None and self.space:
+            # First use after a reload
+            self.ndb.active_coordinates = self.space.get_room_coordinates(
+                self)
         return self.ndb.active_coordinates
 
+    @property
+    def occupant_count(self):
+        """
+        Returns the number of items (everything but the exits) in this room.
+        This is read from the positions kept by the space map, so it does not
+        look at the contents of the room.
+
+        Returns:
+            int: the number of items at the coordinates of this room
+        """
+        if self.coordinates is None:
+            return 0
+        return self.space.itemcoordinates.count_at(self.coordinates)
+
     def at_object_receive(self, moved_obj, source_location):
         """
         Called after an object has been moved into this object. This is a
@@ -544,7 +1589,7 @@ class SpaceRoom(DefaultRoom, Object):
             # n, ne, ... exits.
             return
 
-        itemcoords = self.space.db.itemcoordinates
+        itemcoords = self.space.itemcoordinates
         if moved_obj in itemcoords:
             # This object was already in space. We need to make sure
             # it goes to the correct room it belongs to.
@@ -588,28 +1633,47 @@ class SpaceRoom(DefaultRoom, Object):
         """
         # Remove the reference for the old coordinates...
         rooms = self.space.db.rooms
+        old_coordinates = self.coordinates
         # If the room was never used before, it wont have any coordinates
-        if self.coordinates in rooms:
-            del rooms[self.coordinates]
+        if old_coordinates in rooms:
+            del rooms[old_coordinates]
         # ...and add it for the new coordinates.
         self.ndb.active_coordinates = new_coordinates
         rooms[self.coordinates] = self
-
-        # Every obj inside this room will get its location set to None
-        for item in self.contents:
-            if not item.destination or item.destination != item.location:
-                item.location = None
+        self.space._track_room(self, new_coordinates)
+
+        # Every obj still at the old coordinates will get its location set to
+        # None
+        if old_coordinates is not None:
+            for item in self.space.get_objs_at_coordinates(old_coordinates):
+                if item.location == self:
+                    item.location = None
         # And every obj matching the new coordinates will get its location set
         # to this room
         for item in self.space.get_objs_at_coordinates(new_coordinates):
             item.location = self
 
+        self.refresh_exits()
+
+        # Finally call the at_prepare_room hook to give a chance to further
+        # customise it
+        self.space.mapprovider.at_prepare_room(new_coordinates, obj, self)
+
+    def refresh_exits(self):
+        """
+        Updates the exits of this room to match the map at its current
+        coordinates.
+        """
+        # Virtual exits work out which directions are valid when they are
+        # first needed
+        self.ndb.valid_directions = None
+
         # Fix the lockfuncs for the exit so we can't go where we're not
         # supposed to go
         for exit in self.exits:
             if exit.destination != self:
                 continue
-            x, y, z = get_new_coordinates(new_coordinates, exit.key)
+            x, y, z = get_new_coordinates(self.coordinates, exit.key)
             valid = self.space.is_valid_coordinates((x, y, z))
 
             if valid:
@@ -617,9 +1681,52 @@ class SpaceRoom(DefaultRoom, Object):
             else:
                 exit.locks.add("traverse:false();view:false()")
 
-        # Finally call the at_prepare_room hook to give a chance to further
-        # customise it
-        self.space.mapprovider.at_prepare_room(new_coordinates, obj, self)
+    @property
+    def valid_directions(self):
+        """
+        Returns the directions that can be travelled to from this room. This
+        is worked out once per coordinates and cached until the room moves.
+
+        Returns:
+            [str, ]: the keys (like "north") of the valid directions
+        """
+        if self.ndb.valid_directions is None:
+            coordinates = self.coordinates
+            self.ndb.valid_directions = [
+                key for key, alias in EXITS
+                if self.space.is_valid_coordinates(
+                    get_new_coordinates(coordinates, key))]
+        return self.ndb.valid_directions
+
+    def traverse_direction(self, traversing_object, direction):
+        """
+        Moves traversing_object one step in direction. This is used by the
+        virtual exits: it does the same as traversing a SpaceExit, without
+        having an exit object.
+
+        Args:
+            traversing_object (Object): the object doing the travelling
+            direction (str): a direction string (like "northeast")
+
+        Returns:
+            bool: True if traversing_object was moved
+        """
+        if direction not in self.valid_directions:
+            return False
+        current_coordinates = self.space.itemcoordinates[traversing_object]
+        new_coordinates = get_new_coordinates(current_coordinates, direction)
+        return self.space.traverse_obj(traversing_object, new_coordinates)
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Called by the look command. When the map uses virtual exits they are
+        listed here, as there are no exit objects to show.
+        """
+        string = super(SpaceRoom, self).return_appearance(looker, **kwargs)
+        if self.space.mapprovider.virtual_exits and self.valid_directions:
+            string += "\n|wExits:|n {}".format(
+                ", ".join(self.valid_directions))
+        return string
 
     def get_display_name(self, looker, **kwargs):
         """
@@ -715,7 +1822,7 @@ class SpaceExit(DefaultExit):
             bool: True if the traverse is allowed to happen
 
         """
-        itemcoordinates = self.location.space.db.itemcoordinates
+        itemcoordinates = self.location.space.itemcoordinates
 
         current_coordinates = itemcoordinates[traversing_object]
         new_coordinates = get_new_coordinates(current_coordinates, self.key)
@@ -725,20 +1832,8 @@ class SpaceExit(DefaultExit):
                                             new_coordinates):
             return False
 
-        if not traversing_object.at_before_move(None):
-            return False
-        traversing_object.location.msg_contents("{} leaves to {}".format(
-            traversing_object.key, new_coordinates),
-            exclude=[traversing_object])
-
-        self.location.space.move_obj(traversing_object, new_coordinates)
-
-        traversing_object.location.msg_contents("{} arrives from {}".format(
-            traversing_object.key, current_coordinates),
-            exclude=[traversing_object])
-
-        traversing_object.at_after_move(None)
-        return True
+        return self.location.space.traverse_obj(traversing_object,
+                                                new_coordinates)
 
 
 class SpaceEntrance(DefaultExit):
@@ -777,9 +1872,20 @@ class SpaceMapProvider(object):
     Default Space Map provider.
 
     This is a simple provider that just creates an infinite large grid area.
+
+    When `virtual_exits` is True, rooms are created without exit objects and
+    directional movement is handled by a cmdset on the room instead. Rooms
+    already built (including the spare ones) keep the kind of exits they were
+    created with.
+
+    When `pure_coordinates` is True, the space map caches the answers of
+    `is_valid_coordinates`: set it only if the answer for given coordinates
+    never changes, or call `SpaceScript.invalidate_coordinates` when it does.
     """
     room_typeclass = SpaceRoom
     exit_typeclass = SpaceExit
+    virtual_exits = False
+    pure_coordinates = False
 
     def is_valid_coordinates(self, space, coordinates):
         """Returns True if coordinates is valid and can be walked to.
@@ -828,5 +1934,17 @@ class SpaceMapProvider(object):
             An example use of this would to plug in a randomizer to show different
             descriptions for different coordinates, or place a treasure at a special
             coordinate.
+            The celestial bodies at the coordinates are given by
+            `room.space.sectors.bodies_at(coordinates)`.
         """
         pass
+
+    def get_celestial_bodies(self):
+        """
+        Returns the celestial bodies (stars, planets, moons...) found in this
+        space map.
+
+        Returns:
+            list of SpaceObject: the bodies
+        """
+        return default_bodies()
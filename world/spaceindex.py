@@ -0,0 +1,552 @@
+"""
+Space Index
+
+Spatial indexes answering range queries over the items of a space map:
+which items are inside a box, or within a distance of some coordinates.
+
+Usage:
+
+    Every space map keeps its items in a spatial index next to their
+    coordinates (see `SpacePositionStore`), and answers range queries with
+    `SpaceScript.get_objs_in_box` and `SpaceScript.get_objs_in_radius`.
+
+    ```python
+    for obj, coordinates in space.get_objs_in_radius((0, 0, 0), 10):
+        ...
+    ```
+
+    Two indexes are available, chosen for each space map when it is created
+    (see `create_space`):
+
+    * "grid" (`GridIndex`, the default) - fast and simple, best when items
+      are spread fairly evenly.
+    * "octree" (`OctreeIndex`) - best for very large and sparse maps where
+      items gather in clusters far apart.
+
+    Both answer the same queries: `in_box`, `in_radius`, `nearest` and
+    `occupied` (the distinct coordinates holding items inside a box).
+
+Implementation:
+
+    `GridIndex` splits space in cubic cells of `GRID_CELL_SIZE` coordinates
+    along each axis and keeps the items of each cell in a bucket. A query
+    only looks at the buckets of the cells overlapping the queried box, or at
+    every non-empty bucket when there are fewer of them.
+
+    `OctreeIndex` keeps the items in a tree of cubes, each one split in eight
+    once it holds more than `OCTREE_LEAF_SIZE` items. Empty parts of space
+    take no room and are skipped whole by the queries, so their cost grows
+    with the logarithm of the size of the populated space. The tree grows
+    outwards as items get further away, coordinates are not bounded.
+"""
+
+import heapq
+
+
+# Size of a cell of GridIndex along each axis
+GRID_CELL_SIZE = 8
+# Number of items an OctreeIndex cube holds before it is split in eight
+OCTREE_LEAF_SIZE = 8
+# Size of the first cube of an OctreeIndex along each axis, a power of two
+OCTREE_ROOT_SIZE = 64
+
+
+def box_around(coordinates, radius):
+    """
+    Returns the box holding every coordinates within radius of coordinates.
+
+    Args:
+        coordinates (tuple): the (x, y, z) center of the box
+        radius (int): the distance from the center to the sides of the box
+
+    Returns:
+        tuple: ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+    """
+    x, y, z = coordinates
+    return ((x - radius, y - radius, z - radius),
+            (x + radius, y + radius, z + radius))
+
+
+def distance_squared(start, end):
+    """
+    Returns the squared distance between two coordinates.
+
+    Args:
+        start (tuple): (x, y, z) coordinates
+        end (tuple): (x, y, z) coordinates
+
+    Returns:
+        int: the squared distance
+    """
+    return ((end[0] - start[0]) ** 2 + (end[1] - start[1]) ** 2 +
+            (end[2] - start[2]) ** 2)
+
+
+def in_box(coordinates, bounds):
+    """
+    Returns True if coordinates are inside a box.
+
+    Args:
+        coordinates (tuple): (x, y, z) coordinates
+        bounds (tuple): the corners of the box as
+            ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+    Returns:
+        bool: True if the coordinates are inside the box
+    """
+    (xmin, ymin, zmin), (xmax, ymax, zmax) = bounds
+    x, y, z = coordinates
+    return xmin <= x <= xmax and ymin <= y <= ymax and zmin <= z <= zmax
+
+
+def box_distance_squared(coordinates, low, high):
+    """
+    Returns the squared distance between coordinates and the nearest point
+    of a box.
+
+    Args:
+        coordinates (tuple): (x, y, z) coordinates
+        low (tuple): the (xmin, ymin, zmin) corner of the box
+        high (tuple): the (xmax, ymax, zmax) corner of the box
+
+    Returns:
+        int: the squared distance, 0 inside the box
+    """
+    total = 0
+    for axis in range(3):
+        value = coordinates[axis]
+        if value < low[axis]:
+            total += (low[axis] - value) ** 2
+        elif value > high[axis]:
+            total += (value - high[axis]) ** 2
+    return total
+
+
+class GridIndex(object):
+    """
+    Spatial index made of a uniform grid of buckets.
+    """
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        """
+        Args:
+            cell_size (int, optional): the size of a cell along each axis
+        """
+        self.cell_size = cell_size
+        # Key: cell key, value: {item: coordinates}
+        self._cells = {}
+        self._count = 0
+
+    def cell_key(self, coordinates):
+        """
+        Returns the key of the cell holding coordinates.
+
+        Args:
+            coordinates (tuple): (x, y, z) coordinates
+
+        Returns:
+            tuple: the (x, y, z) index of the cell
+        """
+        size = self.cell_size
+        return (coordinates[0] // size, coordinates[1] // size,
+                coordinates[2] // size)
+
+    def add(self, item, coordinates):
+        """
+        Adds an item to the index.
+
+        Args:
+            item: the item to add
+            coordinates (tuple): the (x, y, z) coordinates of the item
+        """
+        bucket = self._cells.setdefault(self.cell_key(coordinates), {})
+        if item not in bucket:
+            self._count += 1
+        bucket[item] = coordinates
+
+    def remove(self, item, coordinates):
+        """
+        Removes an item from the index. Does nothing if the item is not there.
+
+        Args:
+            item: the item to remove
+            coordinates (tuple): the (x, y, z) coordinates it was added with
+        """
+        key = self.cell_key(coordinates)
+        bucket = self._cells.get(key)
+        if bucket is None or item not in bucket:
+            return
+        del bucket[item]
+        self._count -= 1
+        if not bucket:
+            del self._cells[key]
+
+    def clear(self):
+        """
+        Removes every item from the index.
+        """
+        self._cells = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def in_box(self, bounds):
+        """
+        Returns the items inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, in no particular order
+        """
+        low = self.cell_key(bounds[0])
+        high = self.cell_key(bounds[1])
+        spans = [range(low[axis], high[axis] + 1) for axis in range(3)]
+        cell_count = len(spans[0]) * len(spans[1]) * len(spans[2])
+        if cell_count > len(self._cells):
+            # Fewer buckets than cells in the box: look at every bucket
+            buckets = list(self._cells.values())
+        else:
+            buckets = [self._cells[(cx, cy, cz)]
+                       for cx in spans[0] for cy in spans[1] for cz in spans[2]
+                       if (cx, cy, cz) in self._cells]
+
+        found = []
+        for bucket in buckets:
+            for item, coordinates in bucket.items():
+                if in_box(coordinates, bounds):
+                    found.append((item, coordinates))
+        return found
+
+    def in_radius(self, center, radius):
+        """
+        Returns the items within a distance of some coordinates.
+
+        Args:
+            center (tuple): the (x, y, z) coordinates to measure from
+            radius (int): the greatest distance, included
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, in no particular order
+        """
+        limit = radius * radius
+        return [(item, coordinates) for item, coordinates
+                in self.in_box(box_around(center, radius))
+                if distance_squared(center, coordinates) <= limit]
+
+    def nearest(self, center, count=1):
+        """
+        Returns the items nearest to some coordinates.
+
+        Args:
+            center (tuple): the (x, y, z) coordinates to measure from
+            count (int, optional): the number of items to return
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, nearest first
+        """
+        size = self.cell_size
+        cells = []
+        for key, bucket in self._cells.items():
+            low = (key[0] * size, key[1] * size, key[2] * size)
+            high = (low[0] + size - 1, low[1] + size - 1, low[2] + size - 1)
+            cells.append((box_distance_squared(center, low, high), bucket))
+        cells.sort(key=lambda cell: cell[0])
+
+        found = []
+        for cell_distance, bucket in cells:
+            if len(found) >= count and cell_distance > found[-1][0]:
+                # No item of the remaining cells can be nearer
+                break
+            for item, coordinates in bucket.items():
+                found.append((distance_squared(center, coordinates), item,
+                              coordinates))
+            found.sort(key=lambda entry: entry[0])
+            del found[count:]
+        return [(item, coordinates) for _, item, coordinates in found]
+
+    def occupied(self, bounds):
+        """
+        Returns the coordinates holding at least one item inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            set: the occupied (x, y, z) coordinates
+        """
+        return set(coordinates for _, coordinates in self.in_box(bounds))
+
+
+class _OctreeNode(object):
+    """
+    A cube of an OctreeIndex, either a leaf holding items or split in eight
+    children.
+    """
+    __slots__ = ("low", "size", "items", "children", "count")
+
+    def __init__(self, low, size):
+        # The cube covers low to low + size - 1 along each axis
+        self.low = low
+        self.size = size
+        self.items = {}
+        self.children = None
+        self.count = 0
+
+    @property
+    def high(self):
+        return (self.low[0] + self.size - 1, self.low[1] + self.size - 1,
+                self.low[2] + self.size - 1)
+
+    def contains(self, coordinates):
+        low, size = self.low, self.size
+        return (low[0] <= coordinates[0] < low[0] + size and
+                low[1] <= coordinates[1] < low[1] + size and
+                low[2] <= coordinates[2] < low[2] + size)
+
+    def child_index(self, coordinates):
+        half = self.size // 2
+        low = self.low
+        return ((coordinates[0] >= low[0] + half) << 2 |
+                (coordinates[1] >= low[1] + half) << 1 |
+                (coordinates[2] >= low[2] + half))
+
+    def child(self, index):
+        """
+        Returns a child cube, creating it if needed.
+        """
+        node = self.children[index]
+        if node is None:
+            half = self.size // 2
+            low = (self.low[0] + (half if index & 4 else 0),
+                   self.low[1] + (half if index & 2 else 0),
+                   self.low[2] + (half if index & 1 else 0))
+            node = self.children[index] = _OctreeNode(low, half)
+        return node
+
+    def split(self):
+        items, self.items = self.items, {}
+        self.children = [None] * 8
+        for item, coordinates in items.items():
+            node = self.child(self.child_index(coordinates))
+            node.items[item] = coordinates
+            node.count += 1
+
+    def iter_items(self):
+        if self.children is None:
+            for entry in self.items.items():
+                yield entry
+            return
+        for node in self.children:
+            if node is not None and node.count:
+                for entry in node.iter_items():
+                    yield entry
+
+
+class OctreeIndex(object):
+    """
+    Spatial index made of an octree growing with the populated space.
+    """
+    def __init__(self, leaf_size=OCTREE_LEAF_SIZE, root_size=OCTREE_ROOT_SIZE):
+        """
+        Args:
+            leaf_size (int, optional): the number of items a cube holds
+                before it is split
+            root_size (int, optional): the size of the first cube along each
+                axis, a power of two
+        """
+        self.leaf_size = leaf_size
+        self.root_size = root_size
+        self.clear()
+
+    def clear(self):
+        """
+        Removes every item from the index.
+        """
+        half = self.root_size // 2
+        self._root = _OctreeNode((-half, -half, -half), self.root_size)
+
+    def __len__(self):
+        return self._root.count
+
+    def _grow(self, coordinates):
+        """
+        Doubles the size of the tree towards coordinates.
+        """
+        root = self._root
+        size = root.size
+        low = tuple(root.low[axis] - size if coordinates[axis] < root.low[axis]
+                    else root.low[axis] for axis in range(3))
+        new_root = _OctreeNode(low, size * 2)
+        if root.count:
+            new_root.children = [None] * 8
+            new_root.children[new_root.child_index(root.low)] = root
+            new_root.count = root.count
+        self._root = new_root
+
+    def add(self, item, coordinates):
+        """
+        Adds an item to the index.
+
+        Args:
+            item: the item to add
+            coordinates (tuple): the (x, y, z) coordinates of the item
+        """
+        while not self._root.contains(coordinates):
+            self._grow(coordinates)
+        path = []
+        node = self._root
+        while node.children is not None:
+            path.append(node)
+            node = node.child(node.child_index(coordinates))
+        if item in node.items:
+            node.items[item] = coordinates
+            return
+        node.items[item] = coordinates
+        node.count += 1
+        for parent in path:
+            parent.count += 1
+        if len(node.items) > self.leaf_size and node.size > 1:
+            node.split()
+
+    def remove(self, item, coordinates):
+        """
+        Removes an item from the index. Does nothing if the item is not there.
+
+        Args:
+            item: the item to remove
+            coordinates (tuple): the (x, y, z) coordinates it was added with
+        """
+        if not self._root.contains(coordinates):
+            return
+        path = []
+        node = self._root
+        while node.children is not None:
+            path.append(node)
+            node = node.children[node.child_index(coordinates)]
+            if node is None:
+                return
+        if item not in node.items:
+            return
+        del node.items[item]
+        node.count -= 1
+        for parent in reversed(path):
+            parent.count -= 1
+            if parent.count <= self.leaf_size and parent.children is not None:
+                # Few enough items left to merge the children back
+                parent.items = dict(parent.iter_items())
+                parent.children = None
+
+    def _search(self, node, bounds, found):
+        """
+        Adds the items of node inside bounds to found.
+        """
+        low, high = bounds
+        node_low, node_high = node.low, node.high
+        for axis in range(3):
+            if node_high[axis] < low[axis] or node_low[axis] > high[axis]:
+                return
+        if in_box(node_low, bounds) and in_box(node_high, bounds):
+            # The whole cube is inside the box
+            found.extend(node.iter_items())
+        elif node.children is None:
+            found.extend((item, coordinates) for item, coordinates
+                         in node.items.items() if in_box(coordinates, bounds))
+        else:
+            for child in node.children:
+                if child is not None and child.count:
+                    self._search(child, bounds, found)
+
+    def in_box(self, bounds):
+        """
+        Returns the items inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, in no particular order
+        """
+        found = []
+        if self._root.count:
+            self._search(self._root, bounds, found)
+        return found
+
+    def in_radius(self, center, radius):
+        """
+        Returns the items within a distance of some coordinates.
+
+        Args:
+            center (tuple): the (x, y, z) coordinates to measure from
+            radius (int): the greatest distance, included
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, in no particular order
+        """
+        limit = radius * radius
+        return [(item, coordinates) for item, coordinates
+                in self.in_box(box_around(center, radius))
+                if distance_squared(center, coordinates) <= limit]
+
+    def nearest(self, center, count=1):
+        """
+        Returns the items nearest to some coordinates.
+
+        Args:
+            center (tuple): the (x, y, z) coordinates to measure from
+            count (int, optional): the number of items to return
+
+        Returns:
+            list: `[(item, (x, y, z)), ...]`, nearest first
+        """
+        found = []
+        # Cubes and items still to look at, nearest first. The counter keeps
+        # entries at the same distance from being compared.
+        queue = [(0, 0, self._root, None)]
+        counter = 1
+        while queue and len(found) < count:
+            distance, _, node, coordinates = heapq.heappop(queue)
+            if node is None:
+                found.append((coordinates[0], coordinates[1]))
+                continue
+            if node.children is None:
+                entries = [(distance_squared(center, coords), item, coords)
+                           for item, coords in node.items.items()]
+            else:
+                entries = [(box_distance_squared(center, child.low,
+                                                 child.high), child, None)
+                           for child in node.children
+                           if child is not None and child.count]
+            for entry_distance, entry, coords in entries:
+                if coords is None:
+                    heapq.heappush(queue, (entry_distance, counter, entry,
+                                           None))
+                else:
+                    heapq.heappush(queue, (entry_distance, counter, None,
+                                           (entry, coords)))
+                counter += 1
+        return found
+
+    def occupied(self, bounds):
+        """
+        Returns the coordinates holding at least one item inside a box.
+
+        Args:
+            bounds (tuple): the corners of the box as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            set: the occupied (x, y, z) coordinates
+        """
+        return set(coordinates for _, coordinates in self.in_box(bounds))
+
+
+# The spatial indexes a space map can use, by name
+SPACE_INDEXES = {
+    "grid": GridIndex,
+    "octree": OctreeIndex,
+}
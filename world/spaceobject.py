@@ -16,11 +16,237 @@ Implementation:
 # TODO: Update this doc
 """
 
+from array import array
+from itertools import product
+import os
 from typeclasses.objects import Object
+from world.cache import LRUCache
 from noise import snoise3
 import random
 
 
+# Number of noise samples kept in memory
+NOISE_CACHE_SIZE = 65536
+# Size (along each axis) of the chunks saved by the disk cache
+NOISE_CHUNK_SIZE = 16
+# Number of chunks kept in memory when the disk cache is enabled
+NOISE_CHUNK_CACHE_SIZE = 64
+
+
+class NoiseCache(object):
+    """
+    Cache of the noise samples of SpaceObjects.
+
+    Samples are keyed by (seed, x, y, z): every SpaceObject with the same
+    seed shares the same samples. The cache is bounded and forgets the least
+    recently used samples first.
+
+    When a path is given, samples are also saved to disk by chunks of
+    `NOISE_CHUNK_SIZE` cubed coordinates, one file per chunk, so that they
+    survive a reload. A missing sample then loads (or computes and saves)
+    its whole chunk.
+    """
+    def __init__(self, maxsize=NOISE_CACHE_SIZE, path=None,
+                 chunk_size=NOISE_CHUNK_SIZE):
+        """
+        Args:
+            maxsize (int, optional): the number of samples kept in memory
+            path (str, optional): the directory of the disk cache. No disk
+                cache is used if not given.
+            chunk_size (int, optional): the size of the chunks on disk
+        """
+        self.samples = LRUCache(maxsize=maxsize)
+        self.chunks = LRUCache(maxsize=NOISE_CHUNK_CACHE_SIZE)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks_loaded = 0
+        self.chunks_computed = 0
+
+    def sample(self, body, coordinates):
+        """
+        Returns the noise sample of body's seed at coordinates.
+
+        Args:
+            body (SpaceObject): the object to sample the noise of
+            coordinates (tuple, (int, int, int)): The coordinates to sample
+
+        Returns:
+            int: the sample, between -100 and 100
+        """
+        x, y, z = coordinates
+        key = (body.seed, x, y, z)
+        sample = self.samples.get(key)
+        if sample is None:
+            if self.path:
+                sample = self._sample_from_chunk(body, coordinates)
+            else:
+                sample = body.compute_noise(coordinates)
+            self.samples.set(key, sample)
+        return sample
+
+    def _sample_from_chunk(self, body, coordinates):
+        """
+        Returns a sample out of its chunk, loading or computing the chunk
+        as needed.
+        """
+        size = self.chunk_size
+        x, y, z = coordinates
+        chunk = (x // size, y // size, z // size)
+        key = (body.seed,) + chunk
+        samples = self.chunks.get(key)
+        if samples is None:
+            samples = self._load_chunk(key)
+            if samples is None:
+                corner = (chunk[0] * size, chunk[1] * size, chunk[2] * size)
+                bounds = (corner, (corner[0] + size - 1,
+                                   corner[1] + size - 1,
+                                   corner[2] + size - 1))
+                samples = array("b", body.noise_in_region(bounds))
+                self._save_chunk(key, samples)
+                self.chunks_computed += 1
+            else:
+                self.chunks_loaded += 1
+            self.chunks.set(key, samples)
+        return samples[((x % size) * size + (y % size)) * size + (z % size)]
+
+    def _chunk_path(self, key):
+        return os.path.join(self.path, "{}_{}_{}_{}.noise".format(*key))
+
+    def _load_chunk(self, key):
+        """
+        Loads a chunk from disk, returns None if it was never saved.
+        """
+        filename = self._chunk_path(key)
+        if not os.path.exists(filename):
+            return None
+        samples = array("b")
+        with open(filename, "rb") as chunk_file:
+            samples.fromfile(chunk_file, self.chunk_size ** 3)
+        return samples
+
+    def _save_chunk(self, key, samples):
+        """
+        Saves a chunk to disk. The file is written aside and then renamed, so
+        that a chunk is never read half written.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        filename = self._chunk_path(key)
+        with open(filename + ".tmp", "wb") as chunk_file:
+            samples.tofile(chunk_file)
+        os.rename(filename + ".tmp", filename)
+
+    def clear(self):
+        """
+        Empties the in-memory cache. The disk cache is left untouched.
+        """
+        self.samples.invalidate()
+        self.chunks.invalidate()
+
+    def stats(self):
+        """
+        Returns statistics about the cache.
+
+        Returns:
+            dict: the `LRUCache.stats` of the samples, along with
+                `chunks_loaded` and `chunks_computed` for the disk cache
+        """
+        stats = self.samples.stats()
+        stats["chunks_loaded"] = self.chunks_loaded
+        stats["chunks_computed"] = self.chunks_computed
+        return stats
+
+
+# The cache shared by every SpaceObject
+NOISE_CACHE = NoiseCache()
+
+
+def enable_disk_cache(path):
+    """
+    Makes the shared noise cache save its samples under path, so they survive
+    reloads. This can for instance be called from `at_server_start`.
+
+    Args:
+        path (str): the directory to save the samples in
+    """
+    NOISE_CACHE.path = path
+    NOISE_CACHE.clear()
+
+
+# The noise offsets of each seed, shared by every SpaceObject using it
+_OFFSETS = {}
+
+
+def get_offsets(seed):
+    """
+    Returns the noise offsets of a seed. They are drawn from a generator of
+    their own, so the global `random` module is left untouched and objects
+    can be built from any thread.
+
+    Args:
+        seed (hashable): the seed of a SpaceObject
+
+    Returns:
+        tuple: the (x, y, z) offsets, each between 0 and 1
+    """
+    offsets = _OFFSETS.get(seed)
+    if offsets is None:
+        rng = random.Random(seed)
+        offsets = (rng.random(), rng.random(), rng.random())
+        # Two threads may both compute the offsets of a new seed, they will
+        # store the same values
+        _OFFSETS[seed] = offsets
+    return offsets
+
+
+def bodies_at_coordinates(bodies, coordinates):
+    """
+    Determines which of the bodies are present at the specified coordinates.
+    Bodies sharing the same seed share the same noise, so the noise is only
+    sampled once per distinct seed.
+
+    Args:
+        bodies (list of SpaceObject): the bodies to check
+        coordinates (tuple, (int, int, int)): The coordinates to check
+
+    Returns:
+        list of SpaceObject: the bodies present at the coordinates
+    """
+    samples = {}
+    found = []
+    for body in bodies:
+        sample = samples.get(body.seed)
+        if sample is None:
+            sample = samples[body.seed] = body.noise_at(coordinates)
+        if body.occurs_at(sample):
+            found.append(body)
+    return found
+
+
+def bodies_in_region(bodies, bounds):
+    """
+    Determines where each of the bodies is present inside a region. The noise
+    of the region is only sampled once per distinct seed.
+
+    Args:
+        bodies (list of SpaceObject): the bodies to check
+        bounds (tuple): the corners of the region as
+            ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+    Returns:
+        list: `[(body, [(x, y, z), ...]), ...]`, the coordinates where each
+            body is present, in the order of bodies
+    """
+    samples = {}
+    found = []
+    for body in bodies:
+        if body.seed not in samples:
+            samples[body.seed] = body.noise_in_region(bounds)
+        found.append((body, body.coordinates_from_samples(
+            bounds, samples[body.seed])))
+    return found
+
+
 class SpaceObject(Object):
     # This should inherit from `Object` before we start using it with Evennia
     # In order to run spaceobj-test.py, change it to `object`
@@ -28,16 +254,63 @@ class SpaceObject(Object):
     The SpaceObject class is the parent class for the individual classes for the
     various types of objects you might find in space. It has all of the generic
     functions necessary for an object that appears scattered through space.
+
+    Every object is driven by one noise sample per coordinates, worked out
+    from its seed, and is present where the sample is not over its
+    `threshold`. As a body and its parent bodies (like a Planet and its Star)
+    share the seed, the sample only has to be computed once for all of them.
     """
     def __init__(self, seed, occurs=75):
         self.seed = seed
         self.occurs = occurs
+        # The highest sample at which this object is present
+        self.threshold = occurs
         # Simplex Noise doesn't work on integers, so lets get some seeded
         # random offsets (non-integer) for x, y, and z to overcome this limitation.
-        random.seed(self.seed)
-        self.xoffset = random.random()
-        self.yoffset = random.random()
-        self.zoffset = random.random()
+        self.xoffset, self.yoffset, self.zoffset = get_offsets(self.seed)
+        # Each object has its own generator for anything else it needs to
+        # randomize, never the global one
+        self.rng = random.Random(self.seed)
+
+    def noise_at(self, coordinates):
+        """
+        Returns the noise sample of this object's seed at the coordinates.
+        Samples are cached in `NOISE_CACHE`.
+
+        Args:
+            coordinates (tuple, (int, int, int)): The coordinates to sample
+
+        Returns:
+            int: the sample, between -100 and 100
+        """
+        return NOISE_CACHE.sample(self, coordinates)
+
+    def compute_noise(self, coordinates):
+        """
+        Computes the noise sample of this object's seed at the coordinates,
+        without going through the cache.
+
+        Args:
+            coordinates (tuple, (int, int, int)): The coordinates to sample
+
+        Returns:
+            int: the sample, between -100 and 100
+        """
+        x, y, z = coordinates
+        n = snoise3(x + self.xoffset, y + self.yoffset, z + self.zoffset)
+        return int(n * 100)
+
+    def occurs_at(self, sample):
+        """
+        Determines if this object is present for a noise sample.
+
+        Args:
+            sample (int): a sample returned by `noise_at`
+
+        Returns:
+            bool: True if the object is present
+        """
+        return sample <= self.threshold
 
     def object_at_coordinates(self, coordinates):
         """
@@ -50,10 +323,91 @@ class SpaceObject(Object):
             Returns a boolean. `True` if there is an object at the specified
             coordinates and `False` if there is not.
         """
-        x, y, z = coordinates
-        n = snoise3(x + self.xoffset, y + self.yoffset, z + self.zoffset)
-        o = int(n * 100)
-        return o <= self.occurs
+        return self.noise_at(coordinates) <= self.threshold
+
+    def noise_in_region(self, bounds):
+        """
+        Returns the noise samples of this object's seed for a whole region.
+
+        This still calls `snoise3` once per coordinates, the `noise` module
+        has no vectorized version of it. Sampling a region only saves the
+        per-coordinates overhead of `object_at_coordinates` (the noise cache
+        lookups and the offsets), and lets every body sharing the seed reuse
+        the samples (see `bodies_in_region`).
+
+        Args:
+            bounds (tuple): the corners of the region as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+
+        Returns:
+            array: the samples, the index of `(x, y, z)` being
+                `((x - xmin) * ysize + (y - ymin)) * zsize + (z - zmin)`
+        """
+        (xmin, ymin, zmin), (xmax, ymax, zmax) = bounds
+        # Everything that doesn't change inside the loops is computed once
+        noise = snoise3
+        yoffsets = [y + self.yoffset for y in range(ymin, ymax + 1)]
+        zoffsets = [z + self.zoffset for z in range(zmin, zmax + 1)]
+        samples = array("h")
+        for x in range(xmin, xmax + 1):
+            nx = x + self.xoffset
+            for ny in yoffsets:
+                samples.extend(int(noise(nx, ny, nz) * 100)
+                               for nz in zoffsets)
+        return samples
+
+    def coordinates_from_samples(self, bounds, samples):
+        """
+        Returns the coordinates of a region where this object is present.
+
+        Args:
+            bounds (tuple): the corners of the region as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+            samples (array): the samples returned by `noise_in_region`
+
+        Returns:
+            list: the (x, y, z) coordinates where the object is present
+        """
+        (xmin, ymin, zmin), (xmax, ymax, zmax) = bounds
+        threshold = self.threshold
+        region = product(range(xmin, xmax + 1), range(ymin, ymax + 1),
+                         range(zmin, zmax + 1))
+        return [coordinates for coordinates, sample in zip(region, samples)
+                if sample <= threshold]
+
+    def objects_in_region(self, bounds, mask=False):
+        """
+        Determines where there are objects inside a whole region at once.
+        The noise is sampled once per coordinates, like
+        `object_at_coordinates` does, but without its per-coordinates cache
+        lookups (see `noise_in_region`).
+
+        Args:
+            bounds (tuple): the corners of the region as
+                ((xmin, ymin, zmin), (xmax, ymax, zmax)), both included
+            mask (bool, optional): return a mask instead of a list of
+                coordinates
+
+        Returns:
+            If `mask` is False, a list of the (x, y, z) coordinates where
+            there is an object. Otherwise a bytearray holding 1 where there
+            is an object and 0 where there is not, with the index of
+            `(x, y, z)` being
+            `((x - xmin) * ysize + (y - ymin)) * zsize + (z - zmin)`.
+        """
+        (xmin, ymin, zmin), (xmax, ymax, zmax) = bounds
+        if (xmin, ymin, zmin) == (xmax, ymax, zmax):
+            # A single point: no need to set up a whole region
+            found = self.object_at_coordinates((xmin, ymin, zmin))
+            if mask:
+                return bytearray([found])
+            return [(xmin, ymin, zmin)] if found else []
+
+        samples = self.noise_in_region(bounds)
+        if mask:
+            threshold = self.threshold
+            return bytearray(sample <= threshold for sample in samples)
+        return self.coordinates_from_samples(bounds, samples)
 
 
 class Star(SpaceObject):
@@ -69,17 +423,10 @@ class Planet(Star):
     The planet exists only where there are stars, but not in every location
     """
     def __init__(self, seed=39, star_occurs=75, occurs=75):
-        super(Planet, self).__init__(seed=seed, occurs=star_occurs)
-        self.occurs = occurs
-
-    def object_at_coordinates(self, coordinates):
-        if super(Planet, self).object_at_coordinates(coordinates):
-            x, y, z = coordinates
-            n = snoise3(x + self.xoffset, y + self.yoffset, z + self.zoffset)
-            o = int(n * 100)
-            return o <= self.occurs
-        else:
-            return False
+        # Planets have always been placed by their own limit only, star_occurs
+        # is not applied so that existing worlds keep their planets
+        super(Planet, self).__init__(seed=seed, occurs=occurs)
+        self.star_occurs = star_occurs
 
 
 class Moon(Planet):
@@ -87,15 +434,9 @@ class Moon(Planet):
     The moon exists only where there is a planet, but not in every location
     """
     def __init__(self, seed=39, star_occurs=75, planet_occurs=75, occurs=30):
-        super(Moon, self).__init__(seed=seed, occurs=planet_occurs)
+        # Moons have always been placed by the planet limit only, occurs is
+        # not applied so that existing worlds keep their moons
+        super(Moon, self).__init__(seed=seed, star_occurs=star_occurs,
+                                   occurs=planet_occurs)
         self.planet_occurs = planet_occurs
         self.moon_occurs = occurs
-
-    def object_at_coordinates(self, coordinates):
-        if super(Moon, self).object_at_coordinates(coordinates):
-            x, y, z = coordinates
-            n = snoise3(x + self.xoffset, y + self.yoffset, z + self.zoffset)
-            o = int(n * 100)
-            return o <= self.occurs
-        else:
-            return False
@@ -0,0 +1,57 @@
+from unittest import TestCase
+from world.cache import LRUCache
+
+
+class TestLRUCache(TestCase):
+    """
+    Unit tests for LRUCache.
+
+    Tests:
+     - Hits and misses are counted
+     - The least recently used entry is evicted first
+     - Touching an entry keeps it, without counting a hit
+     - Entries can be invalidated one by one or all at once
+    """
+    def test_hits_and_misses(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", False)
+        self.assertEquals(cache.get("a", default=True), False)
+        stats = cache.stats()
+        self.assertEquals(stats["hits"], 1)
+        self.assertEquals(stats["misses"], 1)
+        self.assertEquals(stats["hit_rate"], 0.5)
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Using "a" makes "b" the least recently used entry
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEquals(cache.stats()["evictions"], 1)
+
+    def test_touch(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertTrue(cache.touch("a"))
+        self.assertFalse(cache.touch("c"))
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEquals(cache.stats()["hits"], 0)
+        self.assertEquals(cache.stats()["misses"], 0)
+
+    def test_invalidate(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.invalidate("a")
+        self.assertNotIn("a", cache)
+        self.assertEquals(len(cache), 1)
+        cache.invalidate()
+        self.assertEquals(len(cache), 0)
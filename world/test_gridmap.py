@@ -0,0 +1,102 @@
+import mmap
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+from world import gridmap
+
+
+PYRAMID = """
+   .
+  ...
+ .....
+.......
+"""
+
+
+class PyramidMapProvider(gridmap.SpaceGridMapProvider):
+    grid = gridmap.GridMap.from_string(PYRAMID)
+    terrain_names = {".": "Inside a pyramid."}
+
+
+class PyramidWildernessMapProvider(gridmap.WildernessGridMapProvider):
+    grid = gridmap.GridMap.from_string(PYRAMID, origin=(10, 10))
+
+
+class TestGridMap(TestCase):
+    """
+    Unit tests for GridMap and the grid backed map providers.
+
+    Tests:
+     - Terrain lookups on a map compiled from a string
+     - Valid coordinates and location names for space and wilderness maps
+     - Loading a map file, memory mapped or not
+     - Pickling a memory mapped map
+    """
+    def test_from_string(self):
+        grid = PyramidMapProvider.grid
+        self.assertEquals((grid.width, grid.height), (7, 4))
+        self.assertEquals(grid.get_terrain(0, 0), ".")
+        self.assertEquals(grid.get_terrain(3, 3), ".")
+        self.assertEquals(grid.get_terrain(2, 3), " ")
+        self.assertIsNone(grid.get_terrain(7, 0))
+        self.assertIsNone(grid.get_terrain(0, -1))
+
+    def test_space_provider(self):
+        provider = PyramidMapProvider()
+        self.assertTrue(provider.pure_coordinates)
+        self.assertTrue(provider.is_valid_coordinates(None, (3, 3, 0)))
+        self.assertFalse(provider.is_valid_coordinates(None, (2, 3, 0)))
+        self.assertFalse(provider.is_valid_coordinates(None, (3, 3, 1)))
+        self.assertEquals(provider.get_location_name((3, 0, 0)),
+                          "Inside a pyramid.")
+        self.assertEquals(provider.get_terrain((0, 3, 0)), " ")
+
+    def test_wilderness_provider(self):
+        provider = PyramidWildernessMapProvider()
+        self.assertTrue(provider.is_valid_coordinates(None, (13, 13)))
+        self.assertFalse(provider.is_valid_coordinates(None, (3, 3)))
+        self.assertEquals(provider.get_location_name((13, 13)), "Unknown")
+
+    def test_from_file(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as map_file:
+            map_file.write(b"ab.\n.c.\n..x")
+
+        grid = gridmap.GridMap.from_file(path)
+        self.assertIsInstance(grid._data, mmap.mmap)
+        self.assertEquals(grid.path, path)
+        self.assertEquals(grid.get_terrain(0, 2), "a")
+        self.assertEquals(grid.get_terrain(2, 0), "x")
+        self.assertEquals(grid.get_terrain(1, 1), "c")
+        self.assertEquals(grid.get_code(2, 0), ord("x"))
+
+        # Providers read the mapped file like a compiled map
+        provider = gridmap.SpaceGridMapProvider()
+        provider.grid = grid
+        provider.terrain_names = {"c": "Crater"}
+        self.assertTrue(provider.is_valid_coordinates(None, (0, 0, 0)))
+        self.assertFalse(provider.is_valid_coordinates(None, (1, 1, 0)))
+        self.assertEquals(provider.get_location_name((1, 1, 0)), "Crater")
+        self.assertEquals(provider.get_terrain((2, 0, 0)), "x")
+
+        # The mapped file is opened again when unpickled
+        grid = pickle.loads(pickle.dumps(grid))
+        self.assertEquals(grid.get_terrain(2, 0), "x")
+
+        read = gridmap.GridMap.from_file(path, use_mmap=False)
+        self.assertIsNone(read.path)
+        self.assertEquals(read.get_terrain(2, 0), "x")
+
+    def test_from_file_uneven_lines(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as map_file:
+            map_file.write(b"ab\n.c.\n..x\n")
+
+        # Lines of different lengths can't be mapped, the file is read
+        grid = gridmap.GridMap.from_file(path)
+        self.assertIsNone(grid.path)
+        self.assertEquals(grid.get_terrain(0, 2), "a")
+        self.assertEquals(grid.get_terrain(2, 2), " ")
@@ -0,0 +1,162 @@
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from evennia import create_object
+from typeclasses.spaceship import SpaceShipConsole, SpaceShipHull
+from world import navigation
+from world import space
+from world.test_resources import SpaceTest
+
+
+class WallMapProvider(space.SpaceMapProvider):
+    """
+    Infinite map with a wall at x=10
+    """
+    pure_coordinates = True
+
+    def is_valid_coordinates(self, space, coordinates):
+        return coordinates[0] < 10
+
+
+class TestNavigation(SpaceTest):
+    """
+    Unit tests for ship navigation.
+
+    Tests:
+     - Heading vectors for each axis
+     - A multi-step course moves the hull straight to the end of the course
+     - A course stops before invalid coordinates
+     - Courses are capped, and not checked step by step in open space
+     - Deleted ships are halted
+     - Positions are written at the end of a batch, and not at all when it
+       fails
+    """
+    def setUp(self):
+        super(TestNavigation, self).setUp()
+        self.hull = create_object(SpaceShipHull, key="hull")
+        space.create_space(mapprovider=WallMapProvider())
+        self.space = space.SpaceScript.objects.get(db_key="space")
+        self.space.move_obj(self.hull, (0, 0, 0))
+
+    def test_heading_vector(self):
+        self.assertEquals(navigation.heading_vector(0, 0), (0, 1, 0))
+        self.assertEquals(navigation.heading_vector(0, 90), (1, 0, 0))
+        self.assertEquals(navigation.heading_vector(0, 225), (-1, -1, 0))
+        self.assertEquals(navigation.heading_vector(45, 180), (0, -1, 1))
+        self.assertEquals(navigation.heading_vector(270, 315), (-1, 1, -1))
+
+    def test_heading_table(self):
+        for lat in range(0, 360, 45):
+            for lon in range(0, 360, 45):
+                heading = navigation.pack_heading(lat, lon)
+                self.assertEquals(navigation.unpack_heading(heading),
+                                  (lat, lon))
+                self.assertEquals(navigation.HEADING_VECTORS[heading],
+                                  navigation.heading_vector(lat, lon))
+        self.assertEquals(navigation.pack_heading(405, -45),
+                          navigation.pack_heading(45, 315))
+
+    def test_console_heading(self):
+        console = create_object(SpaceShipConsole, key="console")
+        self.assertEquals((console.lat, console.lon), (0, 0))
+        console.lat = 90
+        console.lon -= 45
+        self.assertEquals((console.lat, console.lon), (90, 315))
+        self.assertEquals(console.heading_vector, (-1, 1, 1))
+        # The course is saved in a single Attribute
+        self.assertEquals(console.db.heading,
+                          navigation.pack_heading(90, 315))
+
+    def test_move_ship(self):
+        room = self.hull.location
+        coordinates, taken = navigation.move_ship(self.hull, (0, 1, 1), 5)
+        self.assertEquals((coordinates, taken), ((0, 5, 5), 5))
+        self.assertEquals(self.space.itemcoordinates[self.hull], (0, 5, 5))
+        # The hull was alone: its room simply moved along with it
+        self.assertEquals(self.hull.location, room)
+        self.assertEquals(list(self.space.db.rooms.keys()), [(0, 5, 5)])
+
+    def test_blocked_course(self):
+        coordinates, taken = navigation.move_ship(self.hull, (1, 0, 0), 20)
+        self.assertEquals((coordinates, taken), ((9, 0, 0), 9))
+        coordinates, taken = navigation.move_ship(self.hull, (1, 0, 0), 1)
+        self.assertEquals((coordinates, taken), ((9, 0, 0), 0))
+
+    def test_course_limits(self):
+        self.assertFalse(self.space.open_space)
+        coordinates, taken = navigation.move_ship(
+            self.hull, (0, 1, 0), navigation.MAX_STEPS + 5)
+        self.assertEquals((coordinates, taken),
+                          ((0, navigation.MAX_STEPS, 0), navigation.MAX_STEPS))
+
+        space.create_space(name="open")
+        open_space = space.get_space("open")
+        self.assertTrue(open_space.open_space)
+        self.assertEquals(
+            navigation.plot_course(open_space, (1, 2, 3), (-1, 0, 1), 5),
+            ((-4, 2, 8), 5))
+
+    def test_navigation_script(self):
+        console = create_object(SpaceShipConsole, key="console")
+        console.lon = 90
+        self.hull.db.console = console
+        script = navigation.get_navigation_script()
+        self.assertEquals(navigation.get_navigation_script(), script)
+
+        script.engage(self.hull, speed=4)
+        script.advance()
+        self.assertEquals(self.space.itemcoordinates[self.hull], (4, 0, 0))
+        category = self.space.itemcoordinates.category
+        self.assertEquals(self.hull.attributes.get("coordinates",
+                                                   category=category),
+                          (4, 0, 0))
+
+        # The course gets blocked by the wall: the ship stops there
+        script.advance()
+        script.advance()
+        self.assertEquals(self.space.itemcoordinates[self.hull], (9, 0, 0))
+        self.assertNotIn(self.hull, script.ships)
+
+    def test_deleted_ship(self):
+        script = navigation.get_navigation_script()
+        script.engage(self.hull, speed=1)
+        self.hull.delete()
+        script.advance()
+        self.assertEquals(script.ships, {})
+        self.assertEquals(dict(script.db.ships), {})
+
+        # A Hull deleted behind the script's back is dropped on the next tick
+        hull = create_object(SpaceShipHull, key="other")
+        self.space.move_obj(hull, (0, 0, 0))
+        script.engage(hull, speed=1)
+        pre_delete.disconnect(dispatch_uid="navigation_object_delete")
+        self.addCleanup(pre_delete.connect, navigation._at_object_delete,
+                        dispatch_uid="navigation_object_delete")
+        hull.delete()
+        script.advance()
+        script.advance()
+        self.assertEquals(script.ships, {})
+        self.assertEquals(dict(script.db.ships), {})
+
+    def test_position_batch(self):
+        store = self.space.itemcoordinates
+        category = store.category
+        with store.batch():
+            store[self.hull] = (5, 5, 5)
+            # Held back until the end of the batch
+            self.assertEquals(self.hull.attributes.get("coordinates",
+                                                       category=category),
+                              (0, 0, 0))
+        self.assertEquals(self.hull.attributes.get("coordinates",
+                                                   category=category),
+                          (5, 5, 5))
+
+        # A failing batch writes nothing, and its error comes through
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic(), store.batch():
+                store[self.hull] = (7, 7, 7)
+                raise RuntimeError("The move failed")
+        self.assertEquals(self.hull.attributes.get("coordinates",
+                                                   category=category),
+                          (5, 5, 5))
+        store.load()
+        self.assertEquals(store[self.hull], (5, 5, 5))
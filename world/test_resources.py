@@ -0,0 +1,26 @@
+"""
+Test resources
+
+Base classes for the tests using space maps.
+"""
+
+from evennia.utils.test_resources import EvenniaTest
+from world import space
+
+
+class SpaceTestMixin(object):
+    """
+    Forgets the space maps registered by the previous tests (see
+    `world.space.get_space`): the registry outlives the database of each
+    test.
+    """
+    def setUp(self):
+        super(SpaceTestMixin, self).setUp()
+        space.load_spaces()
+
+
+class SpaceTest(SpaceTestMixin, EvenniaTest):
+    """
+    Base class for the tests using space maps.
+    """
+    pass
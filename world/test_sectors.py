@@ -0,0 +1,78 @@
+from unittest import TestCase
+from world import sectors
+from world import spaceobject
+
+
+class TestSectors(TestCase):
+    """
+    Unit tests for the sector generator.
+
+    Tests:
+     - Coordinates are mapped to the right sector, negative ones included
+     - Generated sectors hold the same bodies as checking coordinates one by
+       one
+     - Sectors are cached once generated
+     - Only the sectors ahead of a course are prefetched, and cached ones
+       are kept
+     - Boxes spanning several sectors hold the same bodies as checking
+       coordinates one by one, and can skip the sectors not ready yet
+    """
+    def setUp(self):
+        self.generator = sectors.SectorGenerator(size=4)
+
+    def test_sector_key(self):
+        self.assertEquals(self.generator.sector_key((0, 3, 4)), (0, 0, 1))
+        self.assertEquals(self.generator.sector_key((-1, -4, -5)),
+                          (-1, -1, -2))
+        self.assertEquals(self.generator.sector_bounds((-1, 0, 1)),
+                          ((-4, 0, 4), (-1, 3, 7)))
+
+    def test_bodies_at(self):
+        for coordinates in [(0, 0, 0), (-3, 2, 5), (7, -7, 1)]:
+            expected = spaceobject.bodies_at_coordinates(
+                self.generator.bodies, coordinates)
+            self.assertEquals(self.generator.bodies_at(coordinates), expected)
+
+    def test_cache(self):
+        self.assertFalse(self.generator.is_ready((1, 1, 1)))
+        sector = self.generator.get_sector((1, 1, 1))
+        self.assertTrue(self.generator.is_ready((2, 2, 2)))
+        self.assertIs(self.generator.get_sector((3, 3, 3)), sector)
+
+        # Sectors already generated are not generated again in the background
+        self.generator.prefetch(sector.key)
+        self.assertEquals(self.generator.pending, {})
+
+    def test_prefetch_ahead(self):
+        generator = sectors.SectorGenerator(size=4, maxsize=2)
+        generator.get_sector((0, 0, 0))
+        generator.get_sector((4, 0, 0))
+        # Prefetching a cached sector makes it the most recently used one
+        generator.prefetch_ahead((1, 1, 1), (0, 0, 0))
+        self.assertEquals(generator.pending, {})
+        generator.get_sector((8, 0, 0))
+        self.assertTrue(generator.is_ready((0, 0, 0)))
+        self.assertFalse(generator.is_ready((4, 0, 0)))
+
+    def test_bodies_in_box(self):
+        bounds = ((-2, 1, -5), (5, 2, 3))
+        expected = sorted(
+            (body.__class__.__name__, (x, y, z))
+            for x in range(-2, 6) for y in range(1, 3) for z in range(-5, 4)
+            for body in spaceobject.bodies_at_coordinates(
+                self.generator.bodies, (x, y, z)))
+        found = self.generator.bodies_in_box(bounds)
+        self.assertEquals(sorted((body.__class__.__name__, coordinates)
+                                 for body, coordinates in found), expected)
+        self.assertEquals(len(self.generator.sector_keys(bounds)), 3 * 1 * 3)
+
+        # Only the sectors already generated are read, the others are
+        # generated in the background
+        generator = sectors.SectorGenerator(size=4)
+        prefetched = []
+        generator.prefetch = prefetched.append
+        generator.get_sector((0, 0, 0))
+        found = generator.bodies_in_box(((0, 0, 0), (7, 3, 3)),
+                                        ready_only=True)
+        self.assertEquals(prefetched, [(1, 0, 0)])
+        self.assertTrue(all(coordinates[0] < 4 for body, coordinates in found))
@@ -0,0 +1,60 @@
+from typeclasses.spaceship import SpaceShipHull
+from world import shipyard
+from world import space
+from world.test_resources import SpaceTest
+
+
+class TestShipyard(SpaceTest):
+    """
+    Unit tests for building ships.
+
+    Tests:
+     - A ship is built with its components linked together
+     - A fleet is placed in space in one call
+     - Invalid coordinates build nothing
+     - A failure while placing a fleet leaves the space map as it was
+    """
+    def setUp(self):
+        super(TestShipyard, self).setUp()
+        space.create_space()
+        self.space = space.SpaceScript.objects.get(db_key="space")
+
+    def test_create_ship(self):
+        hull, bridge, console = shipyard.create_ship("ship")
+        self.assertEquals(hull.key, "ship")
+        self.assertEquals(console.location, bridge)
+        self.assertEquals(console.check_integrity(), [])
+        self.assertIsNone(hull.location)
+
+    def test_create_fleet(self):
+        coordinates = [(0, 0, 0), (1, 0, 0), (1, 0, 0)]
+        ships = shipyard.create_fleet(["a", "b", "c"], coordinates)
+        self.assertEquals(len(ships), 3)
+        for (hull, bridge, console), coords in zip(ships, coordinates):
+            self.assertEquals(self.space.get_obj_coordinates(hull), coords)
+            self.assertEquals(hull.location.coordinates, coords)
+        self.assertEquals(ships[1][0].location, ships[2][0].location)
+        self.assertEquals(len(self.space.get_objs_at_coordinates((1, 0, 0))),
+                          2)
+
+    def test_create_fleet_invalid(self):
+        self.assertRaises(ValueError, shipyard.create_fleet, ["a", "b"],
+                          [(0, 0, 0)])
+        self.assertRaises(ValueError, shipyard.create_fleet, ["a"],
+                          [(0, 0, 0)], name="nowhere")
+        self.assertEquals(SpaceShipHull.objects.count(), 0)
+
+    def test_create_fleet_rollback(self):
+        shipyard.create_fleet(["a"], [(0, 0, 0)])
+
+        def failing_create_room(coordinates, report_to):
+            raise RuntimeError("The room could not be prepared")
+
+        self.space._create_room = failing_create_room
+        self.assertRaises(RuntimeError, shipyard.create_fleet, ["b", "c"],
+                          [(0, 0, 0), (5, 0, 0)])
+        del self.space._create_room
+        self.assertEquals(SpaceShipHull.objects.count(), 1)
+        self.assertEquals(list(self.space.db.rooms.keys()), [(0, 0, 0)])
+        self.assertEquals(len(self.space.get_objs_at_coordinates((0, 0, 0))),
+                          1)
@@ -1,10 +1,48 @@
-from evennia import create_object
+from django.db.models.signals import pre_delete
+from evennia import create_object, create_script
 from evennia import DefaultCharacter
-from evennia.utils.test_resources import EvenniaTest
 from world import space
+from world.test_resources import SpaceTest
 
 
-class TestSpace(EvenniaTest):
+class VirtualExitsMapProvider(space.SpaceMapProvider):
+    """
+    Infinite map using virtual exits, where nothing is below z=0
+    """
+    virtual_exits = True
+
+    def is_valid_coordinates(self, space, coordinates):
+        return coordinates[2] >= 0
+
+
+class PreparingMapProvider(space.SpaceMapProvider):
+    """
+    Infinite map counting how often a room is prepared
+    """
+    def __init__(self):
+        self.prepared = 0
+
+    def at_prepare_room(self, coordinates, caller, room):
+        self.prepared += 1
+
+
+class CountingMapProvider(space.SpaceMapProvider):
+    """
+    Pure map provider counting how often the validity of coordinates is
+    checked, where nothing is below z=0
+    """
+    pure_coordinates = True
+
+    def __init__(self):
+        self.checks = 0
+        self.floor = 0
+
+    def is_valid_coordinates(self, space, coordinates):
+        self.checks += 1
+        return coordinates[2] >= self.floor
+
+
+class TestSpace(SpaceTest):
     """
     Unit tests for Space. A modification of unit tests for Wilderness Contrib
         Only minor changes were required to make this work for Space, mostly
@@ -45,14 +83,14 @@ class TestSpace(EvenniaTest):
         space.enter_space(self.char1)
         self.assertIsInstance(self.char1.location, space.SpaceRoom)
         s = self.get_space_script()
-        self.assertEquals(s.db.itemcoordinates[self.char1], (0, 0, 0))
+        self.assertEquals(s.itemcoordinates[self.char1], (0, 0, 0))
 
     def test_enter_space_custom_coordinates(self):
         space.create_space()
         space.enter_space(self.char1, coordinates=(1, 2, 3))
         self.assertIsInstance(self.char1.location, space.SpaceRoom)
         s = self.get_space_script()
-        self.assertEquals(s.db.itemcoordinates[self.char1], (1, 2, 3))
+        self.assertEquals(s.itemcoordinates[self.char1], (1, 2, 3))
 
     def test_enter_space_custom_name(self):
         name = "customnname"
@@ -124,3 +162,360 @@ class TestSpace(EvenniaTest):
         for direction, correct_loc in directions.iteritems():  # Not compatible with Python 3
             new_loc = space.get_new_coordinates(loc, direction)
             self.assertEquals(new_loc, correct_loc, direction)
+
+    def test_get_objs_at_coordinates(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        s.move_obj(self.char2, (1, 1, 1))
+        self.assertEquals(s.get_objs_at_coordinates((0, 0, 0)), [self.char1])
+        self.assertEquals(s.get_objs_at_coordinates((1, 1, 1)), [self.char2])
+
+        # Moving char2 on top of char1 should update the index for both
+        # coordinates
+        s.move_obj(self.char2, (0, 0, 0))
+        self.assertEquals(set(s.get_objs_at_coordinates((0, 0, 0))),
+                          set([self.char1, self.char2]))
+        self.assertEquals(s.get_objs_at_coordinates((1, 1, 1)), [])
+
+    def test_occupant_count(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        room = self.char1.location
+        self.assertEquals(room.occupant_count, 1)
+        s.move_obj(self.char2, (0, 0, 0))
+        self.assertEquals(self.char2.location, room)
+        self.assertEquals(room.occupant_count, 2)
+
+        # char2 leaves: the room stays for char1
+        s.move_obj(self.char2, (1, 0, 0))
+        self.assertEquals(room.occupant_count, 1)
+        self.assertEquals(self.char1.location, room)
+        self.assertNotEqual(self.char2.location, room)
+
+        # char1 leaves an empty room: the room goes along
+        s.move_obj(self.char1, (2, 0, 0))
+        self.assertEquals(self.char1.location, room)
+        self.assertEquals(room.coordinates, (2, 0, 0))
+        self.assertEquals(room.occupant_count, 1)
+        self.assertNotIn((0, 0, 0), s.db.rooms)
+
+    def test_maintenance_script(self):
+        space.create_space()
+        s = self.get_space_script()
+        key = "space_maintenance"
+        maintenance = space.SpaceMaintenanceScript.objects.get(db_key=key)
+        self.assertEquals(maintenance.db.space, s)
+
+        # Deleting the map deletes its maintenance script
+        s.stop()
+        self.assertFalse(
+            space.SpaceMaintenanceScript.objects.filter(db_key=key).exists())
+
+        # A script left behind by an old map is taken over by the new map
+        leftover = create_script(space.SpaceMaintenanceScript, key=key)
+        space.create_space()
+        s = self.get_space_script()
+        self.assertEquals(
+            space.SpaceMaintenanceScript.objects.filter(db_key=key).count(), 1)
+        self.assertEquals(leftover.db.space, s)
+
+    def test_lazy_reload(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (1, 2, 3))
+        room = self.char1.location
+
+        # Forget everything kept in memory, like a reload does
+        room.ndb.spacescript = None
+        room.ndb.active_coordinates = None
+        s.at_start()
+        self.assertIsNone(s.ndb.itemcoordinates)
+
+        # The room finds its space map and coordinates on first use
+        self.assertEquals(room.space, s)
+        self.assertEquals(room.coordinates, (1, 2, 3))
+        self.assertEquals(room.occupant_count, 1)
+        self.assertEquals(space.get_space("space"), s)
+        self.assertIsNone(space.get_space("nowhere"))
+
+        # The rooms keep their coordinates as they move or are put away
+        s.move_obj(self.char1, (5, 5, 5))
+        room.ndb.active_coordinates = None
+        self.assertEquals(room.coordinates, (5, 5, 5))
+        s.move_obj(self.char2, (9, 9, 9))
+        s.move_obj(self.char1, (9, 9, 9))
+        self.assertIn(room, s.db.unused_rooms)
+        room.ndb.active_coordinates = None
+        self.assertIsNone(room.coordinates)
+
+    def test_untagged_room(self):
+        # A room of no space map only looks its tag up once
+        room = create_object(space.SpaceRoom, key="untagged")
+        self.assertIsNone(room.space)
+        with self.assertNumQueries(0):
+            self.assertIsNone(room.space)
+
+    def test_position_store_load(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (1, 2, 3))
+        s.move_obj(self.char2, (1, 2, 3))
+        s.move_obj(self.obj1, (4, 5, 6))
+
+        # One query for the coordinates, one for the items
+        store = space.SpacePositionStore("space")
+        with self.assertNumQueries(2):
+            store.load()
+        self.assertEquals(len(store), 3)
+        self.assertEquals(store[self.obj1], (4, 5, 6))
+        self.assertEquals(set(store.objs_at((1, 2, 3))),
+                          set([self.char1, self.char2]))
+
+    def test_deleted_objects(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        s.move_obj(self.char2, (0, 0, 0))
+        self.char2.delete()
+        self.assertEquals(s.get_objs_at_coordinates((0, 0, 0)), [self.char1])
+        self.assertEquals(len(s.itemcoordinates), 1)
+
+        # The room of the last occupant is put away
+        s.move_obj(self.obj1, (1, 0, 0))
+        room = self.obj1.location
+        self.obj1.delete()
+        self.assertNotIn((1, 0, 0), s.db.rooms)
+        self.assertIn(room, s.db.unused_rooms)
+
+        # Deleting a spare room takes it out of the pool
+        s.refill_room_pool(batch_size=1)
+        pooled = len(s.db.unused_rooms)
+        s.db.unused_rooms[-1].delete()
+        self.assertEquals(len(s.db.unused_rooms), pooled - 1)
+
+    def test_sweep(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        s.move_obj(self.char2, (1, 0, 0))
+
+        # Nothing to do while everything is in place
+        self.assertEquals(s.sweep(), 0)
+
+        # char2 is taken out of space without the space map knowing: its
+        # room is put away
+        self.char2.location = self.room1
+        self.assertEquals(s.sweep(batch_size=1) + s.sweep(batch_size=1), 1)
+        self.assertNotIn(self.char2, s.itemcoordinates)
+        self.assertIn(self.char1, s.itemcoordinates)
+        self.assertNotIn((1, 0, 0), s.db.rooms)
+
+        # char1 is deleted without the space map knowing
+        pre_delete.disconnect(dispatch_uid="space_object_delete")
+        self.addCleanup(pre_delete.connect, space._at_object_delete,
+                        dispatch_uid="space_object_delete")
+        self.char1.delete()
+        self.assertEquals(s.sweep(), 1)
+        self.assertEquals(len(s.itemcoordinates), 0)
+        self.assertEquals(s.itemcoordinates.count_at((0, 0, 0)), 0)
+        self.assertEquals(s.get_objs_in_radius((0, 0, 0), 1), [])
+        self.assertNotIn((0, 0, 0), s.db.rooms)
+
+    def test_move_objs(self):
+        space.create_space(mapprovider=PreparingMapProvider())
+        s = self.get_space_script()
+        char3 = create_object(DefaultCharacter, key="char3")
+        s.move_objs([(self.char1, (0, 0, 0)), (self.char2, (0, 0, 0)),
+                     (char3, (2, 0, 0))])
+        room = self.char1.location
+        self.assertEquals(self.char2.location, room)
+        self.assertEquals(room.coordinates, (0, 0, 0))
+        self.assertEquals(char3.location.coordinates, (2, 0, 0))
+        self.assertEquals(room.occupant_count, 2)
+
+        # The whole group moves on: its room goes along, prepared once
+        prepared = s.mapprovider.prepared
+        s.move_objs([(self.char1, (1, 0, 0)), (self.char2, (1, 0, 0))])
+        self.assertEquals(s.mapprovider.prepared, prepared + 1)
+        self.assertEquals(self.char1.location, room)
+        self.assertEquals(self.char2.location, room)
+        self.assertEquals(room.coordinates, (1, 0, 0))
+        self.assertNotIn((0, 0, 0), s.db.rooms)
+        self.assertEquals(set(s.get_objs_at_coordinates((1, 0, 0))),
+                          set([self.char1, self.char2]))
+
+        # Positions are saved
+        s.itemcoordinates.load()
+        self.assertEquals(s.itemcoordinates[self.char2], (1, 0, 0))
+
+    def test_space_registry(self):
+        space.create_space()
+        s = self.get_space_script()
+        self.assertIs(space.get_space("space"), s)
+        # Stopping a space map deletes it
+        s.stop()
+        self.assertIsNone(space.get_space("space"))
+        space.create_space()
+        s = self.get_space_script()
+        self.assertIs(space.get_space("space"), s)
+        space.load_spaces()
+        self.assertEquals(space.get_space("space"), s)
+
+    def test_get_objs_in_radius(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        s.move_obj(self.char2, (3, 4, 0))
+        self.assertEquals(s.get_objs_in_radius((1, 0, 0), 5),
+                          [(self.char1, (0, 0, 0)), (self.char2, (3, 4, 0))])
+        self.assertEquals(s.get_objs_in_radius((0, 0, 0), 4),
+                          [(self.char1, (0, 0, 0))])
+        self.assertEquals(s.get_objs_in_box(((1, 1, 0), (9, 9, 0))),
+                          [(self.char2, (3, 4, 0))])
+
+        # The index follows the moves
+        s.move_obj(self.char2, (20, 0, 0))
+        self.assertEquals(s.get_objs_in_radius((0, 0, 0), 10),
+                          [(self.char1, (0, 0, 0))])
+
+    def test_octree_index(self):
+        space.create_space(name="sparse", index="octree")
+        s = space.SpaceScript.objects.get(db_key="sparse")
+        s.move_obj(self.char1, (1000000, 0, 0))
+        s.move_obj(self.char2, (-5, 0, 0))
+        self.assertEquals(s.get_nearest_objs((0, 0, 0)),
+                          [(self.char2, (-5, 0, 0))])
+        self.assertEquals(s.get_occupied_coordinates(
+            ((999990, -10, -10), (1000010, 10, 10))), set([(1000000, 0, 0)]))
+        self.assertEquals(s.get_objs_in_radius((999999, 0, 0), 1),
+                          [(self.char1, (1000000, 0, 0))])
+
+        # The index is kept after the store is loaded again
+        s.ndb.itemcoordinates = None
+        self.assertEquals(len(s.get_nearest_objs((0, 0, 0), 5)), 2)
+        self.assertRaises(ValueError, space.create_space, name="bad",
+                          index="unknown")
+
+    def test_position_store(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.move_obj(self.char1, (1, 2, 3))
+
+        # Every item keeps its own coordinates, there is no big dict to
+        # re-pickle on every move
+        self.assertFalse(s.attributes.has("itemcoordinates"))
+        category = s.itemcoordinates.category
+        self.assertEquals(self.char1.attributes.get("coordinates",
+                                                    category=category),
+                          (1, 2, 3))
+
+        # Reloading the store from the database should give back the same
+        # positions and index
+        s.itemcoordinates.load()
+        self.assertEquals(s.itemcoordinates[self.char1], (1, 2, 3))
+        self.assertEquals(s.get_objs_at_coordinates((1, 2, 3)), [self.char1])
+
+        # Leaving space removes the stored coordinates
+        s.at_after_object_leave(self.char1)
+        self.assertNotIn(self.char1, s.itemcoordinates)
+        self.assertFalse(self.char1.attributes.has("coordinates",
+                                                   category=category))
+
+    def test_room_pool(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.db.room_pool_size = 3
+
+        # The pool is refilled in batches, up to its target size
+        self.assertEquals(s.refill_room_pool(batch_size=2), 2)
+        self.assertEquals(s.refill_room_pool(batch_size=2), 1)
+        self.assertEquals(s.refill_room_pool(batch_size=2), 0)
+        self.assertEquals(len(s.db.unused_rooms), 3)
+
+        # Entering space takes a room out of the pool
+        s.move_obj(self.char1, (0, 0, 0))
+        self.assertEquals(len(s.db.unused_rooms), 2)
+        stats = s.room_pool_stats()
+        self.assertEquals(stats["hits"], 1)
+        self.assertEquals(stats["misses"], 0)
+        self.assertEquals(stats["size"], 2)
+        self.assertEquals(stats["target"], 3)
+
+    def test_trim_room_pool(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.db.room_pool_size = 1
+        s.db.room_pool_high = 3
+        s.db.room_pool_low = 2
+        s.db.room_pool_ttl = 0
+        s.refill_room_pool(batch_size=4)
+        self.assertEquals(len(s.db.unused_rooms), 1)
+        s.db.room_pool_size = 4
+        s.refill_room_pool(batch_size=4)
+        self.assertEquals(len(s.db.unused_rooms), 4)
+
+        # Over the high watermark: trimmed back down to the low watermark,
+        # keeping the most recently used rooms
+        kept = list(s.db.unused_rooms)[2:]
+        s.db.room_pool_size = 1
+        self.assertEquals(s.trim_room_pool(), 2)
+        self.assertEquals(list(s.db.unused_rooms), kept)
+        self.assertEquals(s.room_pool_stats()["trimmed"], 2)
+        self.assertEquals(s.room_pool_stats()["objects"],
+                          2 * (1 + len(space.EXITS)))
+
+        # Under the high watermark nothing is deleted
+        self.assertEquals(s.trim_room_pool(), 0)
+
+    def test_trim_room_pool_ttl(self):
+        space.create_space()
+        s = self.get_space_script()
+        s.db.room_pool_size = 4
+        s.db.room_pool_high = 1
+        s.db.room_pool_low = 0
+        s.db.room_pool_ttl = 3600
+        s.refill_room_pool(batch_size=4)
+        s.db.room_pool_size = 0
+        # Rooms that were just put away are not idle for long enough
+        self.assertEquals(s.trim_room_pool(), 0)
+        self.assertEquals(len(s.db.unused_rooms), 4)
+
+    def test_virtual_exits(self):
+        space.create_space(mapprovider=VirtualExitsMapProvider())
+        s = self.get_space_script()
+        s.move_obj(self.char1, (0, 0, 0))
+        room = self.char1.location
+
+        # Rooms are created without any exit object
+        self.assertEquals(room.exits, [])
+        self.assertEquals(len(room.valid_directions), 9)
+        self.assertNotIn("down", room.valid_directions)
+        self.assertIn("|wExits:|n north", room.return_appearance(self.char1))
+
+        self.assertFalse(room.traverse_direction(self.char1, "down"))
+        self.assertTrue(room.traverse_direction(self.char1, "north"))
+        self.assertEquals(s.itemcoordinates[self.char1], (0, 1, 0))
+        self.assertEquals(self.char1.location, room)
+
+    def test_validity_cache(self):
+        space.create_space(mapprovider=CountingMapProvider())
+        s = self.get_space_script()
+        provider = s.mapprovider
+        s.move_obj(self.char1, (0, 0, 0))
+        checks = provider.checks
+
+        # Coming back to the same coordinates is answered from the cache
+        s.move_obj(self.char1, (0, 0, 1))
+        checks = provider.checks
+        s.move_obj(self.char1, (0, 0, 0))
+        self.assertEquals(provider.checks, checks)
+        self.assertTrue(s.validity_cache_stats()["hits"] > 0)
+        down = [e for e in self.char1.location.exits if e.key == "down"][0]
+        self.assertFalse(down.access(self.char1, "traverse"))
+
+        # When the map changes, the exits of the rooms nearby are updated
+        provider.floor = -1
+        s.invalidate_coordinates((0, 0, -1))
+        self.assertTrue(down.access(self.char1, "traverse"))
@@ -0,0 +1,131 @@
+from unittest import TestCase
+from world.spaceindex import GridIndex, OctreeIndex, box_around
+from world.spaceindex import distance_squared, in_box
+
+
+class TestGridIndex(TestCase):
+    """
+    Unit tests for the uniform grid spatial index.
+
+    Tests:
+     - Box and radius queries match a brute force search
+     - Items can be moved and removed
+    """
+    def setUp(self):
+        self.index = GridIndex(cell_size=4)
+        self.items = {}
+        for num in range(200):
+            coordinates = ((num * 7) % 23 - 11, (num * 13) % 19 - 9,
+                           (num * 5) % 17 - 8)
+            self.items[num] = coordinates
+            self.index.add(num, coordinates)
+
+    def test_in_box(self):
+        bounds = ((-3, -5, -2), (6, 2, 4))
+        expected = sorted(
+            num for num, (x, y, z) in self.items.items()
+            if -3 <= x <= 6 and -5 <= y <= 2 and -2 <= z <= 4)
+        self.assertEquals(
+            sorted(num for num, coords in self.index.in_box(bounds)),
+            expected)
+        self.assertEquals(len(self.index.in_box(box_around((0, 0, 0), 100))),
+                          200)
+
+    def test_in_radius(self):
+        expected = sorted(
+            num for num, (x, y, z) in self.items.items()
+            if (x - 1) ** 2 + y ** 2 + (z + 2) ** 2 <= 25)
+        self.assertEquals(
+            sorted(num for num, coords
+                   in self.index.in_radius((1, 0, -2), 5)),
+            expected)
+
+    def test_remove(self):
+        self.index.remove(0, self.items[0])
+        self.index.add(1, (50, 50, 50))
+        self.index.remove(1, self.items[1])
+        self.assertEquals(len(self.index), 199)
+        found = dict(self.index.in_box(box_around((0, 0, 0), 100)))
+        self.assertNotIn(0, found)
+        self.assertEquals(found[1], (50, 50, 50))
+        self.index.clear()
+        self.assertEquals(len(self.index), 0)
+
+
+class TestOctreeIndex(TestCase):
+    """
+    Unit tests for the octree spatial index.
+
+    Tests:
+     - Queries match a brute force search, before and after removals
+     - The tree grows to hold far away items and shrinks back
+     - Nearest items are found in order
+     - Occupied coordinates are listed once
+     - The octree and the grid give the same answers
+    """
+    def setUp(self):
+        self.index = OctreeIndex(leaf_size=4, root_size=8)
+        self.items = {}
+        for num in range(300):
+            coordinates = ((num * 7919) % 2003 - 1000, (num * 104729) % 61 - 30,
+                           (num * 13) % 7 - 3)
+            self.items[num] = coordinates
+            self.index.add(num, coordinates)
+
+    def brute_box(self, bounds):
+        return sorted(num for num, coords in self.items.items()
+                      if in_box(coords, bounds))
+
+    def test_in_box(self):
+        for bounds in (((-3, -5, -2), (6, 2, 4)),
+                       ((-1000, -30, -3), (1000, 30, 3)),
+                       ((500, 0, 0), (900, 30, 3))):
+            self.assertEquals(
+                sorted(num for num, coords in self.index.in_box(bounds)),
+                self.brute_box(bounds))
+        self.assertEquals(len(self.index), 300)
+
+    def test_remove(self):
+        for num in range(0, 300, 2):
+            self.index.remove(num, self.items.pop(num))
+        self.index.remove(1, (5000, 0, 0))
+        bounds = ((-1000, -30, -3), (1000, 30, 3))
+        self.assertEquals(
+            sorted(num for num, coords in self.index.in_box(bounds)),
+            self.brute_box(bounds))
+        self.assertEquals(len(self.index), 150)
+        for num, coords in list(self.items.items()):
+            self.index.remove(num, coords)
+        self.assertEquals(len(self.index), 0)
+        self.assertEquals(self.index.in_box(bounds), [])
+
+    def test_nearest(self):
+        center = (10, 3, -1)
+        expected = sorted(self.items.items(), key=lambda item: (
+            distance_squared(center, item[1]), item[0]))
+        found = self.index.nearest(center, 5)
+        self.assertEquals(
+            [distance_squared(center, coords) for num, coords in found],
+            [distance_squared(center, coords) for num, coords
+             in expected[:5]])
+        self.assertEquals(len(self.index.nearest(center, 1000)), 300)
+
+    def test_occupied(self):
+        self.index.add("extra", self.items[0])
+        bounds = ((-1000, -30, -3), (1002, 30, 3))
+        self.assertEquals(self.index.occupied(bounds),
+                          set(self.items.values()))
+
+    def test_same_as_grid(self):
+        grid = GridIndex()
+        for num, coords in self.items.items():
+            grid.add(num, coords)
+        center = (-200, 0, 0)
+        self.assertEquals(
+            sorted(self.index.in_radius(center, 300)),
+            sorted(grid.in_radius(center, 300)))
+        self.assertEquals(
+            [distance_squared(center, coords) for num, coords
+             in self.index.nearest(center, 10)],
+            [distance_squared(center, coords) for num, coords
+             in grid.nearest(center, 10)])
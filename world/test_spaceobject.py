@@ -1,11 +1,14 @@
+import random
+import shutil
+import tempfile
 from evennia import create_object
 from evennia import DefaultCharacter
-from evennia.utils.test_resources import EvenniaTest
 from world import space
 from world import spaceobject
+from world.test_resources import SpaceTest
 
 
-class TestSpaceObject(EvenniaTest):
+class TestSpaceObject(SpaceTest):
     """
     Unit tests for SpaceObject.
 
@@ -52,3 +55,121 @@ class TestSpaceObject(EvenniaTest):
         self.space_object_repeatability_test(spaceobject.Star())
         self.space_object_repeatability_test(spaceobject.Planet())
         self.space_object_repeatability_test(spaceobject.Moon())
+
+    def space_object_region_test(self, space_object):
+        # The batch evaluation should match the coordinates evaluated one by one
+        bounds = ((-4, -3, -2), (4, 3, 2))
+        expected = [(i, j, k)
+                    for i in range(-4, 5)
+                    for j in range(-3, 4)
+                    for k in range(-2, 3)
+                    if space_object.object_at_coordinates((i, j, k))]
+        self.assertEquals(space_object.objects_in_region(bounds), expected)
+        mask = space_object.objects_in_region(bounds, mask=True)
+        self.assertEquals(len(mask), 9 * 7 * 5)
+        for i, j, k in expected:
+            self.assertEquals(mask[((i + 4) * 7 + (j + 3)) * 5 + (k + 2)], 1)
+        self.assertEquals(sum(mask), len(expected))
+
+        # A single point region uses the single coordinates evaluation
+        found = space_object.object_at_coordinates((1, 2, 3))
+        self.assertEquals(space_object.objects_in_region(((1, 2, 3), (1, 2, 3))),
+                          [(1, 2, 3)] if found else [])
+
+    def test_objects_in_region(self):
+        self.space_object_region_test(spaceobject.Star())
+        self.space_object_region_test(spaceobject.Planet())
+        self.space_object_region_test(spaceobject.Moon())
+
+    def test_bodies_share_noise(self):
+        calls = []
+        original = spaceobject.snoise3
+
+        def counting_snoise3(x, y, z):
+            calls.append((x, y, z))
+            return original(x, y, z)
+
+        spaceobject.snoise3 = counting_snoise3
+        self.addCleanup(setattr, spaceobject, "snoise3", original)
+        spaceobject.NOISE_CACHE.clear()
+
+        # A moon needs a planet, which needs a star: one sample is enough
+        moon = spaceobject.Moon()
+        moon.object_at_coordinates((1, 2, 3))
+        self.assertEquals(len(calls), 1)
+
+        # Bodies with the seed of the moon reuse its cached sample
+        bodies = [spaceobject.Star(), spaceobject.Planet(), moon,
+                  spaceobject.Star(seed=7)]
+        del calls[:]
+        found = spaceobject.bodies_at_coordinates(bodies, (1, 2, 3))
+        self.assertEquals(len(calls), 1)
+        self.assertEquals(found, [body for body in bodies
+                                  if body.object_at_coordinates((1, 2, 3))])
+
+        bounds = ((0, 0, 0), (2, 2, 2))
+        del calls[:]
+        found = spaceobject.bodies_in_region(bodies, bounds)
+        self.assertEquals(len(calls), 2 * 27)
+        for body, coordinates in found:
+            self.assertEquals(coordinates, body.objects_in_region(bounds))
+
+    def test_body_thresholds(self):
+        # Bodies are placed where they always were: a Planet by its own limit
+        # and a Moon by the limit of its Planet
+        planet = spaceobject.Planet(star_occurs=50, occurs=60)
+        moon = spaceobject.Moon(star_occurs=50, planet_occurs=60, occurs=30)
+        self.assertEquals(planet.threshold, 60)
+        self.assertEquals(moon.threshold, 60)
+        self.assertEquals(spaceobject.Moon().threshold, 75)
+        bounds = ((-5, -5, -5), (5, 5, 5))
+        self.assertEquals(moon.objects_in_region(bounds),
+                          planet.objects_in_region(bounds))
+
+    def test_noise_cache(self):
+        cache = spaceobject.NoiseCache(maxsize=2)
+        star = spaceobject.Star()
+        sample = cache.sample(star, (1, 2, 3))
+        self.assertEquals(sample, star.compute_noise((1, 2, 3)))
+        # Every object with the same seed shares the samples
+        cache.sample(spaceobject.Planet(), (1, 2, 3))
+        cache.sample(star, (0, 0, 0))
+        cache.sample(star, (0, 0, 1))
+        stats = cache.stats()
+        self.assertEquals(stats["hits"], 1)
+        self.assertEquals(stats["misses"], 3)
+        self.assertEquals(stats["size"], 2)
+        self.assertEquals(stats["evictions"], 1)
+
+    def test_noise_disk_cache(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        star = spaceobject.Star()
+
+        cache = spaceobject.NoiseCache(path=path, chunk_size=4)
+        for coordinates in [(1, 2, 3), (-1, -2, -3), (3, 3, 3)]:
+            self.assertEquals(cache.sample(star, coordinates),
+                              star.compute_noise(coordinates))
+        self.assertEquals(cache.stats()["chunks_computed"], 2)
+
+        # A new cache (like after a reload) loads the chunks back from disk
+        cache = spaceobject.NoiseCache(path=path, chunk_size=4)
+        self.assertEquals(cache.sample(star, (-1, -2, -3)),
+                          star.compute_noise((-1, -2, -3)))
+        self.assertEquals(cache.stats()["chunks_loaded"], 1)
+        self.assertEquals(cache.stats()["chunks_computed"], 0)
+
+    def test_global_random_untouched(self):
+        random.seed(1234)
+        expected = random.random()
+        random.seed(1234)
+        spaceobject.Star()
+        spaceobject.Moon(seed=5)
+        self.assertEquals(random.random(), expected)
+
+        # The offsets stay the same as when they were drawn from the global
+        # random module
+        random.seed(39)
+        offsets = (random.random(), random.random(), random.random())
+        star = spaceobject.Star(seed=39)
+        self.assertEquals((star.xoffset, star.yoffset, star.zoffset), offsets)